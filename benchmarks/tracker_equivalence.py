@@ -0,0 +1,101 @@
+"""Check that ArrayByteTracker gives the same results as ByteTracker.
+
+The same detections are replayed through both trackers. The detections are
+random objects moving across the frame, with scores on both sides of the
+tracking thresholds, objects entering late, and objects vanishing for up to
+40 frames, i.e. beyond the time a lost track is kept. Every few frames are
+skipped and only predicted, as with a stride. For each frame the check
+compares the ids of the tracked and the lost tracks, in order, and the
+boxes of the tracked tracks.
+Usage: python benchmarks/tracker_equivalence.py [--seeds N] [--frames N]
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from vqpy.base.detections import Detections
+from vqpy.tracker import ArrayByteTracker, ByteTracker
+from vqpy.tracker.base_track import BaseTrack
+
+OBJECT_COUNTS = [5, 40, 200]
+
+
+class Context:
+    fps = 30
+    frame_id = 0
+
+
+def make_scene(rng, n_objects, n_frames):
+    """The detections of each frame, None for a skipped frame"""
+    start = rng.uniform(0, 3000, (n_objects, 2))
+    velocity = rng.normal(0, 4, (n_objects, 2))
+    size = rng.uniform(20, 120, (n_objects, 2))
+    enter = rng.integers(1, n_frames // 2, n_objects)
+    gap_start = rng.integers(1, n_frames, n_objects)
+    gap_end = gap_start + rng.integers(0, 41, n_objects)
+    scenes = []
+    for frame_id in range(1, n_frames + 1):
+        if frame_id % 7 == 0:
+            scenes.append(None)
+            continue
+        visible = ((enter <= frame_id) &
+                   ~((gap_start <= frame_id) & (frame_id < gap_end)) &
+                   (rng.random(n_objects) > 0.05))
+        tl = (start + velocity * frame_id +
+              rng.normal(0, 2, start.shape))[visible]
+        tlbr = np.concatenate([tl, tl + size[visible]], axis=1)
+        score = rng.uniform(0.05, 1, len(tlbr))
+        scenes.append(Detections(tlbr, score,
+                                 np.zeros(len(tlbr), dtype=np.int64)))
+    return scenes
+
+
+def replay(tracker_type, scenes):
+    """The tracked ids, lost ids and tracked boxes of each frame"""
+    BaseTrack._count = 0
+    ctx = Context()
+    tracker = tracker_type(ctx)
+    results = []
+    for frame_id, dets in enumerate(scenes, start=1):
+        ctx.frame_id = frame_id
+        if dets is None:
+            tracked, lost = tracker.predict()
+        else:
+            tracked, lost = tracker.update(dets)
+        results.append(([int(x["track_id"]) for x in tracked],
+                        [int(x["track_id"]) for x in lost],
+                        np.asarray([x["tlbr"] for x in tracked],
+                                   dtype=np.float64).reshape(-1, 4)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", type=int, default=5)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    failures = 0
+    for seed in range(args.seeds):
+        for n_objects in OBJECT_COUNTS:
+            rng = np.random.default_rng(seed)
+            scenes = make_scene(rng, n_objects, args.frames)
+            expected = replay(ByteTracker, scenes)
+            actual = replay(ArrayByteTracker, scenes)
+            for frame_id, (a, b) in enumerate(zip(expected, actual),
+                                              start=1):
+                if (a[0] != b[0] or a[1] != b[1] or
+                        not np.allclose(a[2], b[2], rtol=0, atol=1e-6)):
+                    print(f"seed {seed}, {n_objects} objects: "
+                          f"differs from frame {frame_id}")
+                    failures += 1
+                    break
+            else:
+                print(f"seed {seed}, {n_objects} objects: same results")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark of the IoU and assignment backends of vqpy.tracker.matching.
+
+For each number of tracks, the tracks and the detections of the next frame
+are random boxes moved by a few pixels, and the benchmark times:
+    iou: the IoU cost matrix of the tracks and the detections, from the
+        lists of tracks (each box copied through the `tlbr` property) and
+        from contiguous box arrays, with each available IoU backend;
+    assign: `linear_assignment` of the fused cost matrix with each
+        available assignment backend.
+Usage: python benchmarks/tracker_matching.py [--repeat N]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from vqpy.tracker import matching
+from vqpy.tracker.byte_tracker import ByteTracker, tlbrs
+
+TRACK_COUNTS = [10, 50, 100, 300, 1000]
+
+
+def make_boxes(rng, n_tracks):
+    tl = rng.uniform(0, 4000, (n_tracks, 2))
+    size = rng.uniform(20, 100, (n_tracks, 2))
+    tracks = np.concatenate([tl, tl + size], axis=1)
+    moved = tracks + rng.normal(0, 3, tracks.shape)
+    scores = rng.uniform(0.6, 1, n_tracks)
+    return tracks, moved, scores
+
+
+def time_us(func, repeat):
+    """The best time of a call in us"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    iou_backends = list(matching._iou_backends)
+    assignment_backends = list(matching._assignment_backends)
+    columns = ([f"iou list {x}" for x in iou_backends] +
+               [f"iou array {x}" for x in iou_backends] +
+               [f"assign {x}" for x in assignment_backends])
+    print("time per call in us")
+    print(f"{'tracks':>8}" + "".join(f"{x:>22}" for x in columns))
+    for n_tracks in TRACK_COUNTS:
+        track_boxes, det_boxes, scores = make_boxes(rng, n_tracks)
+        tracks = [ByteTracker.Data({"tlbr": x, "score": 1.0})
+                  for x in track_boxes]
+        dets = [ByteTracker.Data({"tlbr": x, "score": s})
+                for x, s in zip(det_boxes, scores)]
+        row = []
+        for array in (False, True):
+            for backend in iou_backends:
+                matching.set_backend(iou=backend)
+                if array:
+                    row.append(time_us(lambda: matching.iou_distance(
+                        tlbrs(tracks), tlbrs(dets)), args.repeat))
+                else:
+                    row.append(time_us(lambda: matching.iou_distance(
+                        tracks, dets), args.repeat))
+        dists = matching.fuse_score(
+            matching.iou_distance(track_boxes, det_boxes), dets)
+        for backend in assignment_backends:
+            matching.set_backend(assignment=backend)
+            row.append(time_us(lambda: matching.linear_assignment(
+                dists, thresh=0.9), args.repeat))
+        print(f"{n_tracks:>8}" + "".join(f"{x:>22.1f}" for x in row))
+
+
+if __name__ == "__main__":
+    main()
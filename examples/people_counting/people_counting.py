@@ -18,6 +18,8 @@ def make_parser():
 
 
 class Person(vqpy.VObjBase):
+    # direction() looks back 5 frames with a computed index
+    history_length = 5
 
     @vqpy.property()
     @vqpy.stateful(4)
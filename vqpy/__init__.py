@@ -1,23 +1,28 @@
 import json
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from loguru import logger
-from tqdm import tqdm
 
+from .base.detections import Detections  # noqa: F401
 from .base.detector import DetectorBase  # noqa: F401
 from .base.query import QueryBase
 from .base.ground_tracker import GroundTrackerBase  # noqa: F401
-from .detector import setup_detector
+from .detector import resolve_detector, setup_detector
+from .detector.cache import DetectionCache
 from .feat.feat import property, stateful, postproc, cross_vobj_property  # noqa: F401,E501
 from .function import infer  # noqa: F401
 from .function.logger import vqpy_func_logger  # noqa: F401
-from .impl.multiclass_tracker import MultiTracker
 from .impl.vobj_base import VObjBase
 from .impl.vobj_constraint import VObjConstraint  # noqa: F401
+from .impl.chunked import launch_chunked
+from .impl.demand import needs_pixels
 from .impl.frame import Frame
+from .impl.output_sink import output_prefix, save_outputs, setup_output_sink
+from .impl.multi_stream import MultiStreamScheduler, launch_streams  # noqa: F401,E501
+from .impl.multi_video import launch_many  # noqa: F401
+from .impl.runner import run_stream
 from .base.interface import OutputConfig  # noqa: F401
-from .tracker import setup_ground_tracker
 from .utils.classes import COCO_CLASSES  # noqa: F401
 from .utils.video import FrameStream
 from . import utils  # noqa: F401
@@ -31,6 +36,19 @@ def launch(cls_name,
            save_freq: int = 10,
            detector_model_dir: str = None,
            detector_name: str = "yolox",
+           detector_kwargs: Optional[Dict] = None,
+           pipeline: bool = False,
+           pipeline_queue_size: int = 4,
+           detect_batch_size: int = 1,
+           output_format: str = "json",
+           prefetch: int = 0,
+           headless: bool = False,
+           stride: int = 1,
+           target_fps: Optional[float] = None,
+           num_chunks: int = 1,
+           chunk_overlap: int = 30,
+           detection_cache_dir: Optional[str] = None,
+           tracker_name: str = "byte",
            ):
     """Launch the VQPy tasks with specific setting.
     Args:
@@ -42,36 +60,134 @@ def launch(cls_name,
         save_freq: the frequency of save when processing.
         detector_model_dir: the directory for all pretrained detectors.
         detector_name: the specific detector name you desire to use.
+        detector_kwargs: extra arguments passed to the detector, e.g.
+            `intra_op_num_threads` or `optimized_model_dir` for the ONNX-based
+            detectors.
+        pipeline: run decoding and detection on their own workers,
+            overlapping them with tracking and queries. The results are the
+            same as the serial execution.
+        pipeline_queue_size: the maximum number of frame batches waiting
+            between two pipeline stages.
+        detect_batch_size: the number of decoded frames gathered before
+            calling the detector on them as one batch.
+        output_format: "json" keeps the outputs in memory and rewrites the
+            whole json file every save; "jsonl" and "columnar" stream the
+            outputs of each frame to the file in save_folder as they are
+            produced, and each save only flushes it.
+        prefetch: the number of frames decoded ahead on a background thread.
+        headless: do not poll the GUI event loop on each frame.
+        stride: run detection and queries on every `stride`-th frame only.
+            The frames in between are not decoded, and the tracked VObjs are
+            updated with the locations predicted by the tracker, so that the
+            history and time of VObjs still advance frame by frame.
+        target_fps: choose the stride to analyze about `target_fps` frames
+            per second of video, overriding `stride`.
+        num_chunks: split the video into this many time chunks processed by
+            parallel worker processes, each loading its own detector. The
+            track ids are stitched across chunks, so the results approximate
+            those of a serial run. The outputs are saved once at the end.
+        chunk_overlap: the number of frames each chunk processes before its
+            start, to warm up tracking and match the tracks of the previous
+            chunk.
+        detection_cache_dir: cache the detection results of the video in
+            this directory. When all the results are cached, the detector is
+            not loaded, and the frames are not decoded either if no property
+            in use reads the frame images. Not used with num_chunks.
+        tracker_name: the ground tracker of each VObj type, "byte" for
+            ByteTracker, or "byte_array" for its array-backed version with
+            the same results, faster with many objects.
     """
     logger.info(f"VQPy Launch I/O Setting: \
                   video_path={video_path}, save_folder={save_folder}")
-    video_name = os.path.basename(video_path).split(".")[0]
-    stream = FrameStream(video_path)
-    detector_name, detector = setup_detector(cls_name,
-                                             model_dir=detector_model_dir,
-                                             detector_name=detector_name)
-    # Now tracking is always performed by track each class separately
-    frame = Frame(stream)
-    tracker = MultiTracker(setup_ground_tracker, cls_name, cls_type)
+    stream_kwargs = dict(prefetch=prefetch, stride=stride,
+                         target_fps=target_fps)
+    run_kwargs = dict(pipeline=pipeline,
+                      pipeline_queue_size=pipeline_queue_size,
+                      detect_batch_size=detect_batch_size,
+                      tracker_name=tracker_name)
+
+    def task_path(task: QueryBase) -> str:
+        return output_prefix(save_folder, video_path,
+                             task.get_setting().filename, detector_name)
+
     for task in tasks:
         task.vqpy_init()
 
-    tag = stream.n_frames
-    for frame_id in tqdm(range(1, stream.n_frames + 1)):
-        frame_image = stream.next()
-        outputs = detector.inference(frame_image)
-        frame = tracker.update(outputs, frame)
+    if num_chunks > 1:
+        detector_name, outputs = launch_chunked(
+            cls_name, cls_type, tasks, video_path, num_chunks, chunk_overlap,
+            detector_model_dir=detector_model_dir,
+            detector_name=detector_name,
+            detector_kwargs=detector_kwargs,
+            stream_kwargs=stream_kwargs,
+            run_kwargs=run_kwargs)
+        if save_folder:
+            os.makedirs(save_folder, exist_ok=True)
+            for task, (records, summary) in zip(tasks, outputs):
+                save_outputs(output_format, task_path(task), records, summary)
+        logger.info("Done!")
+        return
+
+    # with a detection cache, the frames are prefetched only if they are
+    # decoded, which is decided once the cache is checked below
+    stream = FrameStream(video_path, headless=headless,
+                         **({**stream_kwargs, "prefetch": 0}
+                            if detection_cache_dir else stream_kwargs))
+    detector_name, detector_type, model_filename = \
+        resolve_detector(cls_name, detector_name)
+    streaming = output_format != "json" and bool(save_folder)
+    if streaming:
+        os.makedirs(save_folder, exist_ok=True)
         for task in tasks:
-            task.vqpy_update(frame)
+            task.vqpy_set_sink(setup_output_sink(output_format,
+                                                 task_path(task)))
 
-        if frame_id * save_freq >= tag and save_folder:
+    cache = None
+    cached = False
+    if detection_cache_dir:
+        cache = DetectionCache(
+            detection_cache_dir, video_path,
+            stream.start_frame + stream.n_frames,
+            detector_name, detector_type,
+            os.path.join(detector_model_dir or "", model_filename))
+        cached = cache.is_complete(stream.start_frame + i
+                                   for i in range(stream.n_frames)
+                                   if stream.is_analyzed(i))
+    detector = None
+    if not cached:
+        detector_name, detector = setup_detector(
+            cls_name,
+            model_dir=detector_model_dir,
+            detector_name=detector_name,
+            detector_kwargs=detector_kwargs)
+    decode_frames = not cached or needs_pixels(tasks, cls_type.values())
+    if not decode_frames:
+        logger.info("Replaying cached detections without decoding")
+    elif detection_cache_dir and prefetch > 0:
+        stream.close()
+        stream = FrameStream(video_path, headless=headless, **stream_kwargs)
+
+    tag = stream.n_frames
+
+    def save(n_processed: int, frame: Frame):
+        nonlocal tag
+        if n_processed * save_freq >= tag and save_folder:
             if tag == stream.n_frames:
                 os.makedirs(save_folder, exist_ok=True)
             for task in tasks:
-                task_name = task.get_setting().filename
-                filename = f"{video_name}_{task_name}_{detector_name}.json"
-                save_path = os.path.join(save_folder, filename)
-                with open(save_path, 'w') as f:
+                if streaming:
+                    task.vqpy_flush()
+                    continue
+                with open(task_path(task) + ".json", 'w') as f:
                     json.dump(task.vqpy_getdata(), f)
             tag += stream.n_frames
+
+    try:
+        run_stream(stream, detector, cls_name, cls_type, tasks,
+                   on_frame=save, detection_cache=cache,
+                   decode_frames=decode_frames, **run_kwargs)
+    finally:
+        stream.close()
+        if cache is not None:
+            cache.save()
     logger.info("Done!")
@@ -0,0 +1,96 @@
+"""The detection results of a frame"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+
+
+class Detections(object):
+    """The detected objects of a frame as columns of N rows: the `tlbr`
+    (N, 4), `score` (N,) and `class_id` (N,) arrays, and optional extra
+    columns with N rows, e.g. features.
+    For code written for the list of dicts detectors used to return,
+    indexing by an int gives the dict of one object and iterating gives the
+    dicts of all objects. Indexing by a boolean mask or an index array gives
+    the selected objects as Detections.
+    """
+
+    def __init__(self,
+                 tlbr: np.ndarray = None,
+                 score: np.ndarray = None,
+                 class_id: np.ndarray = None,
+                 **columns: np.ndarray):
+        """Create the detections from the columns, all empty by default"""
+        self.tlbr = np.asarray([] if tlbr is None else tlbr,
+                               dtype=np.float64).reshape(-1, 4)
+        self.score = np.asarray([] if score is None else score,
+                                dtype=np.float64).reshape(-1)
+        self.class_id = np.asarray([] if class_id is None else class_id,
+                                   dtype=np.int64).reshape(-1)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.asarray(column) for name, column in columns.items()}
+        n_rows = len(self.tlbr)
+        for name in self.fields:
+            if len(self.column(name)) != n_rows:
+                raise ValueError(f"Column {name} has "
+                                 f"{len(self.column(name))} rows instead "
+                                 f"of {n_rows}")
+
+    @classmethod
+    def from_dicts(cls, objs: Iterable[Dict]) -> Detections:
+        """Create the detections from the dicts of the objects"""
+        objs = list(objs)
+        if len(objs) == 0:
+            return cls()
+        columns = {name: np.asarray([obj[name] for obj in objs])
+                   for name in objs[0]}
+        return cls(**columns)
+
+    @property
+    def fields(self) -> List[str]:
+        """The names of the columns"""
+        return ["tlbr", "score", "class_id"] + list(self.columns)
+
+    def column(self, name: str) -> np.ndarray:
+        if name in ("tlbr", "score", "class_id"):
+            return getattr(self, name)
+        return self.columns[name]
+
+    def __len__(self) -> int:
+        return len(self.tlbr)
+
+    def __getitem__(self, index) -> Union[Dict, Detections]:
+        if isinstance(index, (int, np.integer)):
+            return {name: _row(self.column(name), index)
+                    for name in self.fields}
+        return Detections(self.tlbr[index], self.score[index],
+                          self.class_id[index],
+                          **{name: column[index]
+                             for name, column in self.columns.items()})
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(self) -> List[Dict]:
+        """The dicts of the objects"""
+        return list(self)
+
+    def __repr__(self) -> str:
+        return f"Detections({len(self)} objects, fields={self.fields})"
+
+
+def _row(column: np.ndarray, index: int):
+    value = column[index]
+    # scalars as the Python numbers detectors used to return
+    return value.item() if np.ndim(value) == 0 else value
+
+
+def as_detections(outputs: Union[Detections, Iterable[Dict]]) -> Detections:
+    """The detections of the outputs of a detector, which may still be a list
+    of dicts for detectors written before Detections"""
+    if isinstance(outputs, Detections):
+        return outputs
+    return Detections.from_dicts(outputs)
@@ -1,21 +1,36 @@
 """The detector base class"""
 
-from typing import Dict, List
+from typing import List
 
 import numpy as np
 
+from .detections import Detections
+
 
 class DetectorBase(object):
     """The base class of all predictors"""
     cls_names = None        # the class names of the classification
     output_fields = []      # the list of data fields the predictor can provide
+    # the score and NMS IoU thresholds of the outputs, None if not applicable
+    confthre = None
+    nmsthre = None
 
     def __init__(self, model_path: str) -> None:
         self.model_path = model_path
 
-    def inference(self, img: np.ndarray) -> List[Dict]:
+    def inference(self, img: np.ndarray) -> Detections:
         """Get the detected objects from the image
         img (np.ndarray): the inferenced images
-        returns: list of objects, expressed in dictionaries
+        returns: the detected objects, expressed in Detections (a list of
+        dictionaries is still accepted)
         """
         raise NotImplementedError
+
+    def inference_batch(self, imgs: List[np.ndarray]) -> List[Detections]:
+        """Get the detected objects from a batch of images
+        imgs (List[np.ndarray]): the inferenced images
+        returns: for each image, the detected objects expressed in Detections
+        Detectors supporting batched models should override this method, by
+        default the images are inferenced one by one.
+        """
+        return [self.inference(img) for img in imgs]
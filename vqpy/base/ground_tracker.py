@@ -1,6 +1,7 @@
 """The ground-level tracker base class"""
 
 from typing import Dict, List, Tuple
+from ..base.detections import Detections
 from ..utils.video import FrameStream
 
 
@@ -12,12 +13,31 @@ class GroundTrackerBase(object):
 
     input_fields = []       # the required data fields for this tracker
     output_fields = []      # the data fields generated by this tracker
+    # whether trackers of different classes can update concurrently, after
+    # reserving their track ids in a fixed order
+    concurrent_update = False
 
     def __init__(self, stream: FrameStream):
         raise NotImplementedError
 
-    def update(self, data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    def update(self, data: Detections) -> Tuple[List[Dict], List[Dict]]:
         """Filter the detected data and associate output data
+        data: the detections of the objects of this tracker
         returns: the current tracked data and the current lost data
         """
         raise NotImplementedError
+
+    def reserve_track_ids(self, data: Detections):
+        """Reserve the track ids the next update with data may take, so that
+        the ids do not depend on the order of concurrent updates. Required
+        if concurrent_update is set.
+        """
+        raise NotImplementedError
+
+    def predict(self) -> Tuple[List[Dict], List[Dict]]:
+        """Advance the tracks by one frame without detections, e.g. on a
+        frame skipped by the stride. No track is created, lost or removed.
+        returns: the current tracked data, with their predicted locations,
+        and the current lost data
+        """
+        raise NotImplementedError
@@ -1,8 +1,10 @@
 """Interfaces that requires implementations in impl/"""
 
 from __future__ import annotations
-from typing import Dict, List, Optional, Callable, Set
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Callable, Tuple
 
+from ..utils.ring_buffer import RingBuffer
 from ..utils.video import FrameStream
 
 from dataclasses import dataclass
@@ -13,16 +15,18 @@ class VObjBaseInterface(object):
     The tracker is responsible to keep objects updated when the track is active
     """
 
+    # Names of the @property methods, and (vobj_type, vobj_input_fields) of
+    # the @cross_vobj_property methods, registered once per class
+    _registered_names: FrozenSet[str] = frozenset()
+    _registered_cross_vobj_names: Mapping[str, Tuple] = MappingProxyType({})
+
     def __init__(self, ctx: FrameStream):
         self._ctx = ctx
         self._start_idx = ctx.frame_id
         # Number of frames consecutively appears
         self._track_length = 0
-        # Historic object data. TODO: shrink memory
-        self._datas: List[Optional[Dict]] = []
-        # List of @property instances
-        self._registered_names: Set[str] = set()
-        self._registered_cross_vobj_names: Set[str] = set()
+        # Historic object data, only the latest frames in use are kept
+        self._datas: RingBuffer = RingBuffer()
         raise NotImplementedError
 
     def getv(self,
@@ -105,6 +109,14 @@ class FrameInterface(object):
                        ) -> List[VObjBaseInterface]:
         raise NotImplementedError
 
+    def remove_dead_vobjs(self, vobj_type: VObjGeneratorType) -> None:
+        raise NotImplementedError
+
+    def get_removed_vobjs(self,
+                          vobj_type: VObjGeneratorType,
+                          ) -> List[VObjBaseInterface]:
+        raise NotImplementedError
+
 
 @dataclass
 class OutputConfig:
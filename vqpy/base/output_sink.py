@@ -0,0 +1,26 @@
+"""The output sink base class"""
+
+from typing import Dict
+
+
+class OutputSinkBase(object):
+    """The base class of query output sinks.
+    A sink receives the query output of each frame once, when it is produced,
+    so the outputs do not have to be kept in memory until the end.
+    """
+
+    def write(self, record: Dict) -> None:
+        """Append the output record of a frame"""
+        raise NotImplementedError
+
+    def write_summary(self, summary: Dict) -> None:
+        """Write the outputs about the whole video, e.g. total_vobj_num"""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persist all records written so far"""
+        pass
+
+    def close(self) -> None:
+        """Flush and release the sink, called after the last frame"""
+        self.flush()
@@ -2,11 +2,15 @@
 
 from __future__ import annotations
 
+from typing import Optional
+
 from ..base.interface import (
+    VObjBaseInterface,
     VObjConstraintInterface,
     OutputConfig,
     FrameInterface
 )
+from ..base.output_sink import OutputSinkBase
 
 
 OUTPUT_FRAME_VOBJ_NUM_NAME = "vobj_num"
@@ -24,13 +28,24 @@ class QueryBase(object):
             cls = cls.__bases__[0]
         return ret
 
-    def vqpy_init(self):
+    def vqpy_init(self, sink: Optional[OutputSinkBase] = None):
+        """
+        sink: when given, the output of each frame is written to the sink
+        instead of being kept in `vqpy_getdata()`, and the total vobj num is
+        written as the summary in `vqpy_finish`.
+        """
         # The data is initialized here to avoid override of __init__()
         self._query_data = []
+        self._sink = sink
         self._setting = self.get_base_setting()
         self._output_configs = self.set_output_configs()
         self._total_ids = set()
 
+    def vqpy_set_sink(self, sink: OutputSinkBase):
+        """Write the outputs of the following frames to the sink, as if it
+        was given to `vqpy_init`"""
+        self._sink = sink
+
     def vqpy_update(self, frame: FrameInterface):
         frame_id: int = frame.ctx.frame_id
         data, filtered_ids = self._setting.apply(frame)
@@ -38,10 +53,11 @@ class QueryBase(object):
         # total vobj num is always the first element of output
         if self._output_configs.output_total_vobj_num:
             self._total_ids.update(filtered_ids)
+        if self._output_configs.output_total_vobj_num and self._sink is None:
             total_vobj_num_data = {
                 OUTPUT_TOTAL_VOBJ_NUM_NAME: len(self._total_ids)
             }
-            if frame_id == 1:
+            if len(self._query_data) == 0:
                 self._query_data = [total_vobj_num_data]
             else:
                 assert OUTPUT_TOTAL_VOBJ_NUM_NAME in self._query_data[0]
@@ -57,10 +73,45 @@ class QueryBase(object):
                 frame_query_data["frame_id"] = frame_id
             frame_query_data["data"] = data
         if frame_query_data:
-            self._query_data.append(frame_query_data)
+            if self._sink is not None:
+                self._sink.write(frame_query_data)
+            else:
+                self._query_data.append(frame_query_data)
+
+        for vobj_type, vobjs in frame.removed_vobjs.items():
+            if self._is_queried_type(vobj_type):
+                for vobj in vobjs:
+                    self.on_track_finalized(vobj)
+
+    def vqpy_finish(self, frame: FrameInterface):
+        """Called after the last frame, finalizes the tracks still alive"""
+        for vobj_type, id_vobjs in frame.vobjs.items():
+            if self._is_queried_type(vobj_type):
+                for vobj in id_vobjs.values():
+                    self.on_track_finalized(vobj)
+        if self._sink is not None:
+            if self._output_configs.output_total_vobj_num:
+                self._sink.write_summary(
+                    {OUTPUT_TOTAL_VOBJ_NUM_NAME: len(self._total_ids)})
+            self._sink.close()
+
+    def vqpy_flush(self):
+        """Persist the outputs written to the sink so far"""
+        if self._sink is not None:
+            self._sink.flush()
+
+    def _is_queried_type(self, vobj_type) -> bool:
+        return self._setting.filter_cons["__class__"](vobj_type)
+
+    def on_track_finalized(self, vobj: VObjBaseInterface):
+        """Called once when the track of a queried VObj ends, either removed
+        by the tracker or at the end of the video. The VObj is dropped right
+        after, override this to flush per-track aggregates."""
+        pass
 
     def vqpy_getdata(self):
-        """Returns the query database of the final data"""
+        """Returns the query database of the final data, the outputs written
+        to a sink are not included"""
         return self._query_data
 
     def get_setting(self):
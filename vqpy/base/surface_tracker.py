@@ -1,7 +1,6 @@
 """the surface-level tracker base class"""
 
-from typing import Dict, List
-
+from ..base.detections import Detections
 from ..base.interface import FrameInterface
 
 
@@ -13,7 +12,7 @@ class SurfaceTrackerBase(object):
 
     input_fields = []       # the required data fields for this tracker
 
-    def update(self, data: List[Dict]) -> FrameInterface:
+    def update(self, data: Detections) -> FrameInterface:
         """Generate the video objects using ground tracker and detection result
         returns: the current tracked/lost VObj instances"""
         raise NotImplementedError
@@ -10,15 +10,13 @@ from vqpy.detector.yolox import *   # noqa: F401,F403
 from .logger import vqpy_detectors
 from ..base.detector import DetectorBase
 import os
+from typing import Dict, Optional, Tuple
 from loguru import logger
 
 
-def setup_detector(cls_names,
-                   model_dir: str = None,
-                   detector_name: str = None,
-                   ) -> DetectorBase:
-    """setup a detector for video analytics
-    cls_names: the detection class types of the required detector
+def resolve_detector(cls_names, detector_name: str = None) -> Tuple:
+    """Find a registered detector by name, or by its detection classes
+    returns: the detector name, type and model filename
     """
     if detector_name:
         if detector_name not in vqpy_detectors:
@@ -34,6 +32,24 @@ def setup_detector(cls_names,
             if cls_names == detector_type.cls_names:
                 print(f"Detector {detector_name} has been selected!")
                 break
+    return detector_name, detector_type, model_filename
+
+
+def setup_detector(cls_names,
+                   model_dir: str = None,
+                   detector_name: str = None,
+                   detector_kwargs: Optional[Dict] = None,
+                   ) -> DetectorBase:
+    """setup a detector for video analytics
+    cls_names: the detection class types of the required detector
+    detector_kwargs: extra arguments for the detector constructor, e.g. the
+        ONNX Runtime session options of the ONNX-based detectors
+    """
+    detector_name, detector_type, model_filename = \
+        resolve_detector(cls_names, detector_name)
     logger.info(f"Detector {detector_name} is chosen!")
     detector_model_path = os.path.join(model_dir, model_filename)
-    return detector_name, detector_type(model_path=detector_model_path)
+    if detector_kwargs is None:
+        detector_kwargs = {}
+    return detector_name, detector_type(model_path=detector_model_path,
+                                        **detector_kwargs)
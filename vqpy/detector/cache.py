@@ -0,0 +1,124 @@
+"""On-disk cache of the detection results of a video.
+The results are keyed by the video content, the detector name, the hash of
+its weights and its thresholds, so that later runs of different queries over
+the same video replay the detections instead of running the detector.
+They are stored as columns in .npy files loaded with memory mapping:
+    index: (n_frames, 2) int64, the first row and the number of rows of
+        each frame, with -1 rows for a frame not cached
+    tlbr: (n_rows, 4) float32, score: (n_rows,) float32,
+    class_id: (n_rows,) int32
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+from ..base.detections import Detections, as_detections
+
+_COLUMNS = ("index", "tlbr", "score", "class_id")
+_BLOCK_SIZE = 1 << 20
+
+
+def file_fingerprint(path: str) -> str:
+    """A hash of the whole file, read in blocks. Reading is much cheaper than
+    decoding the video, and any edit of the file changes the hash."""
+    if not os.path.exists(path):
+        return "missing"
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """The cached detection results of a video, by frame index"""
+
+    def __init__(self,
+                 cache_dir: str,
+                 video_path: str,
+                 n_frames: int,
+                 detector_name: str,
+                 detector_type: type,
+                 model_path: str):
+        """n_frames: the number of frames of the video"""
+        key = json.dumps([file_fingerprint(video_path),
+                          detector_name,
+                          file_fingerprint(model_path),
+                          detector_type.confthre,
+                          detector_type.nmsthre])
+        name = hashlib.sha1(key.encode()).hexdigest()
+        self.prefix = os.path.join(cache_dir, name)
+        self.n_frames = n_frames
+        self._index = np.full((n_frames, 2), -1, dtype=np.int64)
+        self._columns = None
+        self._new: Dict[int, Detections] = {}
+        if all(os.path.exists(self._path(x)) for x in _COLUMNS):
+            self._columns = {x: np.load(self._path(x), mmap_mode='r')
+                             for x in _COLUMNS}
+            n_cached = min(n_frames, len(self._columns["index"]))
+            self._index[:n_cached] = self._columns["index"][:n_cached]
+            logger.info(f"Loaded detection cache {self.prefix}")
+
+    def _path(self, column: str) -> str:
+        return f"{self.prefix}.{column}.npy"
+
+    def get(self, index: int) -> Optional[Detections]:
+        """The detection results of the frame, None if not cached"""
+        if index in self._new:
+            return self._new[index]
+        start, count = self._index[index]
+        if count < 0:
+            return None
+        rows = slice(start, start + count)
+        return Detections(self._columns["tlbr"][rows],
+                          self._columns["score"][rows],
+                          self._columns["class_id"][rows])
+
+    def put(self, index: int, outputs: Detections):
+        self._new[index] = as_detections(outputs)
+
+    def is_complete(self, indices) -> bool:
+        """Whether all the frames of the indices are cached"""
+        return all(x in self._new or self._index[x][1] >= 0 for x in indices)
+
+    def save(self):
+        """Write the new results along with the cached ones"""
+        if len(self._new) == 0:
+            return
+        index = np.full((self.n_frames, 2), -1, dtype=np.int64)
+        frames = []
+        n_rows = 0
+        for i in range(self.n_frames):
+            outputs = self.get(i)
+            if outputs is None:
+                continue
+            index[i] = n_rows, len(outputs)
+            n_rows += len(outputs)
+            frames.append(outputs)
+        columns = {
+            "index": index,
+            "tlbr": np.concatenate([x.tlbr for x in frames] +
+                                   [np.empty((0, 4))]).astype(np.float32),
+            "score": np.concatenate([x.score for x in frames] +
+                                    [np.empty(0)]).astype(np.float32),
+            "class_id": np.concatenate([x.class_id for x in frames] +
+                                       [np.empty(0, dtype=np.int64)]
+                                       ).astype(np.int32),
+        }
+        os.makedirs(os.path.dirname(self.prefix) or ".", exist_ok=True)
+        # release the memory maps before replacing their files
+        self._columns = None
+        for column in _COLUMNS:
+            tmp_path = f"{self._path(column)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, columns[column])
+            os.replace(tmp_path, self._path(column))
+        self._columns = columns
+        self._index = index
+        self._new = {}
+        logger.info(f"Saved detection cache {self.prefix}")
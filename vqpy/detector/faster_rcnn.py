@@ -1,9 +1,11 @@
-from vqpy.detector.utils import onnx_inference
+from vqpy.detector.utils import BufferPool, OnnxSession
+from vqpy.base.detections import Detections
 from vqpy.base.detector import DetectorBase
 from vqpy.utils.classes import COCO_CLASSES
 import numpy as np
-from typing import Dict, List
+from typing import Optional
 import cv2
+import math
 from vqpy.detector.logger import register
 
 
@@ -13,39 +15,50 @@ class FasterRCNNDdetector(DetectorBase):
     cls_names = COCO_CLASSES
     output_fields = ["tlbr", "score", "class_id"]
 
-    def inference(self, img: np.ndarray) -> List[Dict]:
-        processed_img = preprocess(img)
-        detections = onnx_inference(processed_img, self.model_path)
+    def __init__(self, model_path: str, **session_options):
+        """session_options are passed to `OnnxSession`, e.g. the thread
+        counts, the execution providers and the optimized model cache."""
+        super().__init__(model_path)
+        self.session = OnnxSession(model_path, **session_options)
+        self.buffers = BufferPool()
+
+    def inference(self, img: np.ndarray) -> Detections:
+        processed_img = preprocess(img, self.buffers)
+        detections = self.session.run(processed_img)
         outputs = postprocess(detections, img.shape)
         return outputs
 
 
-def preprocess(image):
-    # Resize
-    ratio = 800.0 / min(image.shape[0], image.shape[1])
-    image = cv2.resize(
-        image,
-        (int(ratio * image.shape[1]), int(ratio * image.shape[0])),
-        interpolation=cv2.INTER_LINEAR).astype('float32')
+MEAN_VEC = np.array([102.9801, 115.9465, 122.7717])
 
-    # HWC -> CHW
-    image = np.transpose(image, [2, 0, 1])
 
-    # Normalize
-    mean_vec = np.array([102.9801, 115.9465, 122.7717])
-    for i in range(image.shape[0]):
-        image[i, :, :] = image[i, :, :] - mean_vec[i]
+def preprocess(image, buffers: Optional[BufferPool] = None):
+    """Resize the image to 800 pixels on the short side, subtract the mean
+    and pad it to a multiple of 32 as a (3, H, W) float32 array.
+    buffers: the pool of the resized image and the output, a new array is
+        returned when None.
+    """
+    if buffers is None:
+        buffers = BufferPool()
+    # Resize
+    ratio = 800.0 / min(image.shape[0], image.shape[1])
+    h, w = int(ratio * image.shape[0]), int(ratio * image.shape[1])
+    image_resized = cv2.resize(image, (w, h),
+                               dst=buffers.get((h, w, 3), image.dtype),
+                               interpolation=cv2.INTER_LINEAR)
 
     # Pad to be divisible of 32
-    import math
-    padded_h = int(math.ceil(image.shape[1] / 32) * 32)
-    padded_w = int(math.ceil(image.shape[2] / 32) * 32)
-
-    padded_image = np.zeros((3, padded_h, padded_w), dtype=np.float32)
-    padded_image[:, :image.shape[1], :image.shape[2]] = image
-    image = padded_image
+    padded_h = int(math.ceil(h / 32) * 32)
+    padded_w = int(math.ceil(w / 32) * 32)
+    padded_image = buffers.get((3, padded_h, padded_w))
+    padded_image[:, h:, :] = 0
+    padded_image[:, :h, w:] = 0
 
-    return image
+    # HWC -> CHW and Normalize in one pass
+    np.subtract(np.transpose(image_resized, [2, 0, 1]),
+                MEAN_VEC[:, np.newaxis, np.newaxis],
+                out=padded_image[:, :h, :w], casting='unsafe')
+    return padded_image
 
 
 def postprocess(detections, image_size):
@@ -54,13 +67,7 @@ def postprocess(detections, image_size):
     ratio = 800.0 / min(image_size[0], image_size[1])
     boxes /= ratio
 
-    rets = []
-    for (tlbr, score, class_id) in zip(boxes, scores, labels):
-        # todo: convert dict to named tuple
-        rets.append({"tlbr": np.asarray(tlbr),
-                     "score": score.item(),
-                     "class_id": class_id - 1})
-    return rets
+    return Detections(boxes, scores, np.asarray(labels) - 1)
 
 
 register("faster_rcnn", FasterRCNNDdetector, "FasterRCNN-10.onnx")
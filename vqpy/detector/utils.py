@@ -1,9 +1,122 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+class OnnxSession:
+    """A persistent ONNX Runtime session owned by a detector.
+    The model is loaded and optimized once when the detector is set up, and
+    every following inference call reuses the same session.
+    """
+
+    def __init__(self,
+                 model_path: str,
+                 providers: Optional[List[str]] = None,
+                 intra_op_num_threads: int = 0,
+                 inter_op_num_threads: int = 0,
+                 graph_optimization_level: str = "all",
+                 optimized_model_dir: Optional[str] = None):
+        """Create the inference session.
+        Args:
+            model_path: the path of the ONNX model.
+            providers: the execution providers in priority order. Defaults to
+                CUDA (when available) followed by CPU.
+            intra_op_num_threads: threads used inside an operator, 0 lets
+                ONNX Runtime decide.
+            inter_op_num_threads: threads used across operators, 0 lets
+                ONNX Runtime decide.
+            graph_optimization_level: one of "disable", "basic", "extended"
+                and "all".
+            optimized_model_dir: when provided, the optimized model is cached
+                in this directory and loaded directly in later runs.
+        """
+        import onnxruntime as rt
+
+        if graph_optimization_level not in _GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown graph optimization level "
+                             f"{graph_optimization_level}, choose from "
+                             f"{list(_GRAPH_OPTIMIZATION_LEVELS.keys())}")
+        if providers is None:
+            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+        available = rt.get_available_providers()
+        providers = [x for x in providers if x in available]
+
+        options = rt.SessionOptions()
+        options.intra_op_num_threads = intra_op_num_threads
+        options.inter_op_num_threads = inter_op_num_threads
+        level = getattr(rt.GraphOptimizationLevel,
+                        _GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level])
+
+        load_path = model_path
+        if optimized_model_dir is not None:
+            cache_path = self._cache_path(model_path, providers,
+                                          graph_optimization_level,
+                                          optimized_model_dir)
+            if (os.path.exists(cache_path) and
+                    os.path.getmtime(cache_path) >=
+                    os.path.getmtime(model_path)):
+                logger.info(f"Loading optimized model from {cache_path}")
+                # the cached graph has already been optimized
+                load_path = cache_path
+                level = rt.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                os.makedirs(optimized_model_dir, exist_ok=True)
+                options.optimized_model_filepath = cache_path
+        options.graph_optimization_level = level
+
+        self.model_path = model_path
+        self.session = rt.InferenceSession(load_path, sess_options=options,
+                                           providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    @staticmethod
+    def _cache_path(model_path, providers, graph_optimization_level,
+                    optimized_model_dir):
+        # optimized graphs may contain provider specific nodes
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        suffix = "_".join(x.replace("ExecutionProvider", "").lower()
+                          for x in providers)
+        return os.path.join(
+            optimized_model_dir,
+            f"{name}.{graph_optimization_level}.{suffix}.onnx")
+
+    def run(self, img_data):
+        """Run the model on the preprocessed input"""
+        return self.session.run(None, {self.input_name: img_data})
+
+
+class BufferPool:
+    """Reusable arrays owned by a detector for preprocessing.
+    The preprocessed images are written in place into the buffers, which are
+    allocated once per shape, so preprocessing a frame of the same size
+    allocates nothing. A buffer is overwritten by the next request of the
+    same shape, so it is only valid until the next inference.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[Tuple, np.ndarray] = {}
+
+    def get(self, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        """The buffer of the shape and dtype, with unspecified content"""
+        key = (tuple(shape), np.dtype(dtype))
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer
+
 
 def onnx_inference(img_data, model_path):
-    import onnxruntime as rt
-    sess = rt.InferenceSession(
-        model_path,
-        providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
-    input_name = sess.get_inputs()[0].name
-    outputs = sess.run(None, {input_name: img_data})
-    return outputs
+    """Run a model once with a temporary session.
+    Detectors should own an `OnnxSession` instead, this reloads the model.
+    """
+    return OnnxSession(model_path).run(img_data)
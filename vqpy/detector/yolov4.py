@@ -1,8 +1,9 @@
-from vqpy.detector.utils import onnx_inference
+from vqpy.detector.utils import BufferPool, OnnxSession
+from vqpy.base.detections import Detections
 from vqpy.base.detector import DetectorBase
 from vqpy.utils.classes import COCO_CLASSES
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 import cv2
 from scipy import special
 from vqpy.detector.logger import register
@@ -11,6 +12,8 @@ from vqpy.detector.logger import register
 MODEL_INPUT_SIZE = (416, 416)
 STRIDES = [8, 16, 32]
 XYSCALE = [1.2, 1.1, 1.05]
+# The number of rows of the IoU matrix computed at once by the NMS
+NMS_BLOCK_SIZE = 256
 ANCHORS = np.array([12, 16, 19, 36, 40, 28, 36, 75, 76, 55, 72, 146, 142, 110,
                     192, 243, 459, 401], dtype=np.float32).reshape(3, 3, 2)
 
@@ -20,34 +23,82 @@ class Yolov4Detector(DetectorBase):
 
     cls_names = COCO_CLASSES
     output_fields = ["tlbr", "score", "class_id"]
-
-    def inference(self, img: np.ndarray) -> List[Dict]:
-        processed_img = preprocess(img)
-        detections = onnx_inference(processed_img, self.model_path)
-        outputs = postprocess(detections, img.shape)
-        return outputs
-
-
-def preprocess(image):
+    confthre = 0.25
+    nmsthre = 0.213
+
+    def __init__(self, model_path: str, **session_options):
+        """session_options are passed to `OnnxSession`, e.g. the thread
+        counts, the execution providers and the optimized model cache."""
+        super().__init__(model_path)
+        self.session = OnnxSession(model_path, **session_options)
+        self.buffers = BufferPool()
+
+    def inference(self, img: np.ndarray) -> Detections:
+        return self.inference_batch([img])[0]
+
+    def inference_batch(self, imgs: List[np.ndarray]) -> List[Detections]:
+        processed_imgs = self.buffers.get((len(imgs),) + MODEL_INPUT_SIZE +
+                                          (3,))
+        for img, out in zip(imgs, processed_imgs):
+            preprocess(img, out, self.buffers)
+        detections = self.session.run(processed_imgs)
+        # the model outputs are batched along the first axis
+        return [postprocess([x[i:i + 1] for x in detections], img.shape,
+                            self.confthre, self.nmsthre)
+                for i, img in enumerate(imgs)]
+
+
+def preprocess(image, out=None, buffers: Optional[BufferPool] = None):
+    """Letterbox the BGR image into the RGB model input normalized to [0, 1].
+    out: the (416, 416, 3) float32 array written, a new (1, 416, 416, 3)
+        array when None.
+    buffers: the pool of the resized image buffer.
+    """
     # this function is from tensorflow-yolov4-tflite/core/utils.py
-    image = np.copy(image)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     ih, iw = MODEL_INPUT_SIZE
     h, w, _ = image.shape
+    if out is None:
+        image_data = np.empty((1, ih, iw, 3), dtype=np.float32)
+        preprocess(image, image_data[0], buffers)
+        return image_data
 
     scale = min(iw/w, ih/h)
     nw, nh = int(scale * w), int(scale * h)
-    image_resized = cv2.resize(image, (nw, nh))
+    image_resized = None
+    if buffers is not None:
+        image_resized = buffers.get((nh, nw, 3), image.dtype)
+    image_resized = cv2.resize(image, (nw, nh), dst=image_resized)
 
-    image_padded = np.full(shape=[ih, iw, 3], fill_value=128.0)
+    out.fill(128.0 / 255.)
     dw, dh = (iw - nw) // 2, (ih-nh) // 2
-    image_padded[dh:nh+dh, dw:nw+dw, :] = image_resized
-    image_padded = image_padded / 255.
-    image_data = image_padded[np.newaxis, ...].astype(np.float32)
-    return image_data
+    # BGR to RGB and the normalization in one pass
+    np.divide(image_resized[:, :, ::-1], 255., out=out[dh:nh+dh, dw:nw+dw, :],
+              casting='unsafe')
+    return out
+
+
+# The anchor grids by the output size, shared by all frames
+_anchor_grids: Dict[int, np.ndarray] = {}
 
 
-def postprocess(detections, image_size):
+def anchor_grid(output_size: int) -> np.ndarray:
+    """The (1, output_size, output_size, 3, 2) grid of the cell coordinates
+    of the anchors"""
+    xy_grid = _anchor_grids.get(output_size)
+    if xy_grid is None:
+        xy_grid = np.meshgrid(np.arange(output_size),
+                              np.arange(output_size))
+        xy_grid = np.expand_dims(np.stack(xy_grid, axis=-1), axis=2)
+
+        xy_grid = np.tile(np.expand_dims(xy_grid, axis=0), [1, 1, 1, 3, 1])
+        xy_grid = xy_grid.astype(np.float64)
+        xy_grid.flags.writeable = False
+        _anchor_grids[output_size] = xy_grid
+    return xy_grid
+
+
+def postprocess(detections, image_size, score_threshold=0.25,
+                iou_threshold=0.213):
     def postprocess_bbbox(pred_bbox):
         '''define anchor boxes'''
         for i, pred in enumerate(pred_bbox):
@@ -55,12 +106,7 @@ def postprocess(detections, image_size):
             output_size = conv_shape[1]
             conv_raw_dxdy = pred[:, :, :, :, 0:2]
             conv_raw_dwdh = pred[:, :, :, :, 2:4]
-            xy_grid = np.meshgrid(np.arange(output_size),
-                                  np.arange(output_size))
-            xy_grid = np.expand_dims(np.stack(xy_grid, axis=-1), axis=2)
-
-            xy_grid = np.tile(np.expand_dims(xy_grid, axis=0), [1, 1, 1, 3, 1])
-            xy_grid = xy_grid.astype(np.float)
+            xy_grid = anchor_grid(output_size)
 
             pred_xy = ((special.expit(conv_raw_dxdy) * XYSCALE[i]) -
                        0.5 * (XYSCALE[i] - 1) + xy_grid) * STRIDES[i]
@@ -149,50 +195,79 @@ def postprocess(detections, image_size):
         """
         :param bboxes: (xmin, ymin, xmax, ymax, score, class)
 
+        All classes are suppressed in one pass: the boxes are sorted by
+        class and score, and the boxes of each class are offset by a multiple
+        of the largest coordinate, so that boxes of different classes never
+        overlap. The IoU of the remaining sorted boxes is computed in blocks
+        of rows, each against the remaining boxes up to the end of the class
+        of its last row, which tell the boxes suppressed by each kept box.
+        The kept boxes are returned class by class, each class in the order
+        the boxes were kept.
+
         Note: soft-nms, https://arxiv.org/pdf/1704.04503.pdf
             https://github.com/bharatsingh430/soft-nms
         """
+        assert method in ['nms', 'soft-nms']
+        if len(bboxes) == 0:
+            return []
         classes_in_img = list(set(bboxes[:, 5]))
-        best_bboxes = []
-
-        for cls in classes_in_img:
-            cls_mask = (bboxes[:, 5] == cls)
-            cls_bboxes = bboxes[cls_mask]
-
-            while len(cls_bboxes) > 0:
-                max_ind = np.argmax(cls_bboxes[:, 4])
-                best_bbox = cls_bboxes[max_ind]
-                best_bboxes.append(best_bbox)
-                cls_bboxes = np.concatenate([cls_bboxes[: max_ind],
-                                             cls_bboxes[max_ind + 1:]])
-                iou = bboxes_iou(best_bbox[np.newaxis, :4], cls_bboxes[:, :4])
-                weight = np.ones((len(iou),), dtype=np.float32)
-
-                assert method in ['nms', 'soft-nms']
-
-                if method == 'nms':
-                    iou_mask = iou > iou_threshold
-                    weight[iou_mask] = 0.0
-
-                if method == 'soft-nms':
-                    weight = np.exp(-(1.0 * iou ** 2 / sigma))
-
-                cls_bboxes[:, 4] = cls_bboxes[:, 4] * weight
-                score_mask = cls_bboxes[:, 4] > 0.
-                cls_bboxes = cls_bboxes[score_mask]
+        rank = {cls: i for i, cls in enumerate(classes_in_img)}
+        class_ranks = np.array([rank[x] for x in bboxes[:, 5]])
+        order = np.lexsort((-bboxes[:, 4], class_ranks))
+        bboxes = bboxes[order]
+        class_ranks = class_ranks[order]
+        # the end of the class of each box
+        class_ends = np.searchsorted(class_ranks, class_ranks, side='right')
+
+        offset = bboxes[:, :4].max() + 1
+        boxes = bboxes[:, :4] + (class_ranks * offset)[:, np.newaxis]
+        n_boxes = len(boxes)
+
+        if method == 'nms':
+            suppressed = np.zeros(n_boxes, dtype=bool)
+            keep = []
+            for start in range(0, n_boxes, NMS_BLOCK_SIZE):
+                stop = min(start + NMS_BLOCK_SIZE, n_boxes)
+                rows = start + np.flatnonzero(~suppressed[start:stop])
+                if len(rows) == 0:
+                    continue
+                end = class_ends[stop - 1]
+                # the boxes suppressed by each remaining box of the block,
+                # among the remaining boxes after it
+                columns = start + np.flatnonzero(~suppressed[start:end])
+                suppression = bboxes_iou(boxes[rows, np.newaxis],
+                                         boxes[np.newaxis, columns])
+                suppression = suppression > iou_threshold
+                for row, i in enumerate(rows):
+                    if not suppressed[i]:
+                        keep.append(i)
+                        suppressed[columns] |= suppression[row]
+            return list(bboxes[keep])
 
+        best_bboxes = []
+        class_starts = np.flatnonzero(np.diff(class_ranks, prepend=-1))
+        for start in class_starts:
+            cls_bboxes = bboxes[start:class_ends[start]].copy()
+            scores = cls_bboxes[:, 4]
+            alive = np.ones(len(cls_bboxes), dtype=bool)
+            while alive.any():
+                alive_indices = np.flatnonzero(alive)
+                i = alive_indices[np.argmax(scores[alive_indices])]
+                best_bboxes.append(cls_bboxes[i].copy())
+                alive[i] = False
+                alive_indices = np.flatnonzero(alive)
+                iou = bboxes_iou(cls_bboxes[i, :4],
+                                 cls_bboxes[alive_indices, :4])
+                scores[alive_indices] *= np.exp(-(1.0 * iou ** 2 / sigma))
+                alive &= scores > 0.
         return best_bboxes
 
     pred_bbox = postprocess_bbbox(detections)
-    bboxes = postprocess_boxes(pred_bbox, image_size, score_threshold=0.25)
-    bboxes = nms(bboxes, 0.213, method='nms')
-
-    rets = []
-    for bbox in bboxes:
-        rets.append({"tlbr": np.asarray(bbox[:4]),
-                     "score": bbox[4],
-                     "class_id": int(bbox[5])})
-    return rets
+    bboxes = postprocess_boxes(pred_bbox, image_size, score_threshold)
+    bboxes = nms(bboxes, iou_threshold, method='nms')
+    bboxes = np.asarray(bboxes).reshape(-1, 6)
+
+    return Detections(bboxes[:, :4], bboxes[:, 4], bboxes[:, 5])
 
 
 register("yolov4", Yolov4Detector, "yolov4.onnx")
@@ -3,16 +3,18 @@ Based on demo implementation in Megvii YOLOX repo
 The YOLOX detector for object detection
 """
 
-from typing import Dict, List
+from typing import List
 
+import cv2
 import numpy as np
 import torch
 from loguru import logger
+from vqpy.base.detections import Detections
 from vqpy.base.detector import DetectorBase
 from vqpy.utils.classes import COCO_CLASSES
 from vqpy.detector.logger import register
+from vqpy.detector.utils import BufferPool
 
-from yolox.data.data_augment import ValTransform
 from yolox.exp.build import get_exp
 from yolox.utils import postprocess
 from yolox.utils.model_utils import get_model_info
@@ -23,12 +25,14 @@ class YOLOXDetector(DetectorBase):
 
     cls_names = COCO_CLASSES
     output_fields = ["tlbr", "score", "class_id"]
+    confthre = 0.3
+    nmsthre = 0.3
 
     def __init__(self, model_path, device="gpu", fp16=True):
         # TODO: start a new process handling this
         exp = get_exp(None, "yolox_x")
-        exp.test_conf = 0.3
-        exp.nmsthre = 0.3
+        exp.test_conf = self.confthre
+        exp.nmsthre = self.nmsthre
         exp.test_size = (640, 640)
 
         model = exp.get_model()
@@ -52,41 +56,57 @@ class YOLOXDetector(DetectorBase):
         self.test_size = exp.test_size
         self.device = device
         self.fp16 = fp16
-        self.preproc = ValTransform(legacy=False)
+        self.buffers = BufferPool()
         self.postproc = postprocess
 
-    def inference(self, img) -> List[Dict]:
-        ratio = min(self.test_size[0] / img.shape[0],
-                    self.test_size[1] / img.shape[1])
+    def inference(self, img) -> Detections:
+        return self.inference_batch([img])[0]
 
-        img, _ = self.preproc(img, None, self.test_size)
-        img = torch.from_numpy(img).unsqueeze(0)
-        img = img.float()
+    def inference_batch(self, imgs: List[np.ndarray]) -> List[Detections]:
+        ratios = [min(self.test_size[0] / img.shape[0],
+                      self.test_size[1] / img.shape[1]) for img in imgs]
+
+        batch = self.buffers.get((len(imgs), 3) + self.test_size)
+        for img, ratio, out in zip(imgs, ratios, batch):
+            self.preprocess(img, ratio, out)
+        batch = torch.from_numpy(batch)
+        batch = batch.float()
         if self.device == "gpu":
-            img = img.cuda()
+            batch = batch.cuda()
             if self.fp16:
-                img = img.half()  # to FP16
+                batch = batch.half()  # to FP16
 
         with torch.no_grad():
-            outputs = self.model(img)
+            outputs = self.model(batch)
             outputs = self.postproc(
                 outputs, self.num_classes, self.confthre,
                 self.nmsthre, class_agnostic=True
             )
 
-        outputs = outputs[0]
+        return [self._to_detections(output, ratio)
+                for output, ratio in zip(outputs, ratios)]
+
+    def preprocess(self, img: np.ndarray, ratio: float, out: np.ndarray):
+        """Write the image resized by ratio and padded at the bottom right,
+        as the (3, H, W) float32 model input, to out.
+        The same as the ValTransform of YOLOX, without the allocations."""
+        h, w = int(img.shape[0] * ratio), int(img.shape[1] * ratio)
+        resized = cv2.resize(img, (w, h),
+                             dst=self.buffers.get((h, w, 3), np.uint8),
+                             interpolation=cv2.INTER_LINEAR)
+        out[:, h:, :] = 114
+        out[:, :h, w:] = 114
+        np.copyto(out[:, :h, :w], resized.transpose(2, 0, 1),
+                  casting='unsafe')
+
+    @staticmethod
+    def _to_detections(outputs, ratio) -> Detections:
         if outputs is None:
-            return []
+            return Detections()
         bboxes = (outputs[:, 0:4] / ratio).cpu()
-        scores = (outputs[:, 4:5] * outputs[:, 5:6]).cpu()
-        cls = outputs[:, 6:7].cpu()
-
-        rets = []
-        for (tlbr, score, class_id) in zip(bboxes, scores, cls):
-            rets.append({"tlbr": np.asarray(tlbr),
-                         "score": score.item(),
-                         "class_id": int(class_id.item())})
-        return rets
+        scores = (outputs[:, 4] * outputs[:, 5]).cpu()
+        cls = outputs[:, 6].cpu()
+        return Detections(bboxes.numpy(), scores.numpy(), cls.numpy())
 
 
 register("yolox", YOLOXDetector, "yolox_x.pth")
@@ -27,10 +27,8 @@ def property():
                     setattr(self, vidx, value)
                     setattr(self, aidx, self._ctx.frame_id)
                     return value
-            elif func.__name__ not in self._registered_names:
-                # initialization
-                self._registered_names.add(func.__name__)
-                return None
+        # registered by VObjBase for each class with this marker
+        wrapper._vqpy_property = True
         return wrapper
     return decorator
 
@@ -55,6 +53,8 @@ def stateful(length: int = 0):
             values.append(new_value)
             setattr(self, attr, values)
             return values[-1]
+        # the number of frames reserved, read by VObjBase for its history
+        wrapper._vqpy_stateful_length = length
         return wrapper
     return decorator
 
@@ -90,6 +90,7 @@ def postproc(params: Dict):
                     if it is not None and v > ret[1]:
                         ret = (it, v)
                 return ret[0]
+            wrapper._vqpy_postproc = True
             return wrapper
         return decorator
     else:
@@ -151,7 +152,6 @@ def cross_vobj_property(
         ):
             # parameter cross_vobj_arg has default value None to maintain
             # the "same" interface with @property upon being called directly
-            # this compatibility is used in VObjBase.__init__ at instance()
             if len(self._datas) > 0:
                 vidx = '__record_' + func.__name__
                 aidx = '__index_' + func.__name__
@@ -162,11 +162,7 @@ def cross_vobj_property(
                     setattr(self, vidx, value)
                     setattr(self, aidx, self._ctx.frame_id)
                     return value
-            elif func.__name__ not in self._registered_cross_vobj_names:
-                # initialization
-                # register function name, required VObj type and fields
-                self._registered_cross_vobj_names[func.__name__] = \
-                    (vobj_type, vobj_input_fields)
-                return None
+        # the required VObj type and fields, registered by VObjBase
+        wrapped_func._vqpy_cross_vobj = (vobj_type, vobj_input_fields)
         return wrapped_func
     return wrap
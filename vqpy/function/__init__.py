@@ -4,42 +4,30 @@ The (expected) only visible interface of this folder is `infer`.
 """
 
 from queue import Queue
-from typing import Any, Dict, List
+from typing import (Any, Callable, Dict, FrozenSet, Iterable, List, Optional,
+                    Tuple)
 
 from ..utils.strings import longest_prefix_in as _default_metric
 
 # import the library to include default builtin functions
 from .functions import *  # noqa: F401,F403
-from .logger import _vqpy_basefuncs, _vqpy_libfuncs
+from .logger import _vqpy_basefuncs, _vqpy_infer_plans, _vqpy_libfuncs
 
 # TODO: formally define the format of `specifications`, supporting more
 # accurate automatic selection, applicable condition for functions, etc.
 
+# An infer plan: the library calls in execution order, each with its
+# function, its (input field, whether the field exists) bindings and its
+# output fields, and the inferred attribute
+InferPlanType = Tuple[Tuple[Tuple[Callable, Tuple[Tuple[str, bool], ...],
+                                  Tuple[str, ...]], ...], str]
 
-def infer(obj,
-          attr: str,
-          existing_fields: List[str],
-          existing_pfields: List[str] = [],
-          specifications=None):
-    """Infer a undefined attribute with provided fields and logged functions
-    Args:
-        obj (VObjBase): the vobject itself.
-        attr (str): the attribute name to infer.
-        existing_fields (List[str]): existing fields in this frame.
-        existing_pfields (List[str], optional):
-            existing fields in past frames. Defaults to [].
-        specifications (Any, optional): hints for the infer. Defaults to None.
-        Currently, we accept a set of strings as hints, and choose the function
-        having the longest prefix of the provided hints.
 
-    Returns:
-        The inferred attribute value.
-    """
-    if attr not in _vqpy_basefuncs:
-        return None
-    if specifications is None:
-        specifications = {}
-    data: Dict[str, Any] = {}
+def _compile_plan(attr: str,
+                  existing_fields: FrozenSet[str],
+                  existing_pfields: FrozenSet[str],
+                  specifications: Dict) -> Optional[InferPlanType]:
+    """Choose the library calls inferring attr, see `infer`"""
     waitlist = [attr]
     calls = []
     q: Queue = Queue()
@@ -90,14 +78,98 @@ def infer(obj,
         calls.append(best)
     calls.reverse()
     # logger.info(f'Infer execution order: {calls}')
+    plan = []
     for name in calls:
         input_fields, output_fields, _, func = _vqpy_libfuncs[name]
-        # print(input_fields)
-        args = [obj] + [obj.getv(x) if x in existing_fields else
-                        data[x] for x in input_fields]
+        inputs = tuple((x, x in existing_fields) for x in input_fields)
+        plan.append((func, inputs, tuple(output_fields)))
+    return tuple(plan), waitlist[0]
+
+
+def infer_plan(attr: str,
+               existing_fields: Iterable[str],
+               existing_pfields: Iterable[str] = frozenset(),
+               specifications=None) -> Optional[InferPlanType]:
+    """The plan of `infer`, compiled once for each attribute, sets of
+    existing fields and specifications until a function is logged.
+    Returns None if the attribute cannot be inferred."""
+    if attr not in _vqpy_basefuncs:
+        return None
+    if specifications is None:
+        specifications = {}
+    existing_fields = frozenset(existing_fields)
+    existing_pfields = frozenset(existing_pfields)
+    key = (attr, existing_fields, existing_pfields,
+           tuple(sorted(specifications.items())))
+    if key not in _vqpy_infer_plans:
+        _vqpy_infer_plans[key] = _compile_plan(
+            attr, existing_fields, existing_pfields, specifications)
+    return _vqpy_infer_plans[key]
+
+
+def run_plan(obj, plan: InferPlanType):
+    """Run the library calls of an infer plan on the vobject"""
+    calls, attr = plan
+    data: Dict[str, Any] = {}
+    for func, inputs, output_fields in calls:
         # this is the required args format
+        args = [obj] + [obj.getv(x) if existing else data[x]
+                        for x, existing in inputs]
         outputs = func(*args)
         for i, value in enumerate(outputs):
             data[output_fields[i]] = value
+    return data[attr]
+
+
+def is_batched(plan: InferPlanType) -> bool:
+    """Whether the plan calls a library function logged with batch=True"""
+    return any(func._vqpy_batch for func, _, _ in plan[0])
+
+
+def run_plan_batch(objs: List, plan: InferPlanType) -> List:
+    """Run an infer plan on the vobjects, each batched library function is
+    called once on all of them
+    Returns: the inferred attribute value of each vobject."""
+    calls, attr = plan
+    datas: List[Dict[str, Any]] = [{} for _ in objs]
+    for func, inputs, output_fields in calls:
+        columns = [[obj.getv(x) if existing else data[x]
+                    for obj, data in zip(objs, datas)]
+                   for x, existing in inputs]
+        if func._vqpy_batch:
+            outputs = func.batch(objs, *columns)
+            for field, values in zip(output_fields, outputs):
+                for data, value in zip(datas, values):
+                    data[field] = value
+        else:
+            for i, (obj, data) in enumerate(zip(objs, datas)):
+                outputs = func(obj, *[column[i] for column in columns])
+                for field, value in zip(output_fields, outputs):
+                    data[field] = value
+    return [data[attr] for data in datas]
+
+
+def infer(obj,
+          attr: str,
+          existing_fields: List[str],
+          existing_pfields: List[str] = [],
+          specifications=None):
+    """Infer a undefined attribute with provided fields and logged functions
+    Args:
+        obj (VObjBase): the vobject itself.
+        attr (str): the attribute name to infer.
+        existing_fields (List[str]): existing fields in this frame.
+        existing_pfields (List[str], optional):
+            existing fields in past frames. Defaults to [].
+        specifications (Any, optional): hints for the infer. Defaults to None.
+        Currently, we accept a set of strings as hints, and choose the function
+        having the longest prefix of the provided hints.
 
-    return data[waitlist[0]]
+    Returns:
+        The inferred attribute value.
+    """
+    plan = infer_plan(attr, existing_fields, existing_pfields,
+                      specifications)
+    if plan is None:
+        return None
+    return run_plan(obj, plan)
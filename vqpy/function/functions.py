@@ -23,14 +23,18 @@ def bbox_velocity(obj, tlbr):
 def image_boundarycrop(obj, frame, tlbr):
     """crop the image of object from bounding box"""
     from vqpy.utils.images import crop_image
+    if frame is None:
+        # a frame skipped by the stride is not decoded
+        return [None]
     return [crop_image(frame, tlbr)]
 
 
-@vqpy_func_logger(['image'], ['license_plate'], [], required_length=1)
-def license_plate_lprnet(obj, image):
-    """recognize license plate using LPRNet"""
-    from vqpy.models.lprnet import GetLP
-    return [GetLP(image)]
+@vqpy_func_logger(['image'], ['license_plate'], [], required_length=1,
+                  batch=True)
+def license_plate_lprnet(objs, images):
+    """recognize license plates using LPRNet, batched over the VObjs"""
+    from vqpy.models.lprnet import GetLPs
+    return [GetLPs(images)]
 
 
 @vqpy_func_logger(['image'], ['license_plate'], [], required_length=1)
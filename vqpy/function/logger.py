@@ -6,13 +6,16 @@ from typing import Callable, Dict, List, Tuple
 _vqpy_basefuncs: Dict[str, List[str]] = {}
 _vqpy_libfuncs: Dict[str,
                      Tuple[List[str], List[str], List[str], Callable]] = {}
+# the compiled plans of infer, see vqpy.function.infer_plan
+_vqpy_infer_plans: Dict[Tuple, object] = {}
 
 
 def vqpy_func_logger(input_fields,
                      output_fields,
                      past_fields,
                      specifications=None,
-                     required_length=-1):
+                     required_length=-1,
+                     batch=False):
     """Add function to log
     Args:
         input_fields: required fields in this frame.
@@ -20,13 +23,42 @@ def vqpy_func_logger(input_fields,
         past_fields: required fields in past frames.
         specifications: preference of the function.
         required_length: the minimum track length for function to be useful.
+        batch: whether the function is called with the list of VObjs and a
+            list of values of each input field, and returns a list of values
+            of each output field, so that it runs once for all VObjs of a
+            frame. The logged function can still be called on one VObj.
     """
     def decorator(func: Callable):
-        @functools.wraps(func)
-        def wrapper(obj, *args, **kwargs):
-            if obj._track_length < required_length and required_length >= 0:
-                return [None]
-            return func(obj, *args, **kwargs)
+        if batch:
+            def batch_wrapper(objs, *columns):
+                """the output values of the objs, None for the VObjs
+                tracked shorter than required_length"""
+                ready = [i for i, obj in enumerate(objs)
+                         if obj._track_length >= required_length or
+                         required_length < 0]
+                outputs = [[None] * len(objs) for _ in output_fields]
+                if len(ready) > 0:
+                    results = func([objs[i] for i in ready],
+                                   *[[column[i] for i in ready]
+                                     for column in columns])
+                    for output, values in zip(outputs, results):
+                        for i, value in zip(ready, values):
+                            output[i] = value
+                return outputs
+
+            @functools.wraps(func)
+            def wrapper(obj, *args):
+                outputs = batch_wrapper([obj], *[[x] for x in args])
+                return [values[0] for values in outputs]
+            wrapper.batch = batch_wrapper
+        else:
+            @functools.wraps(func)
+            def wrapper(obj, *args, **kwargs):
+                if (obj._track_length < required_length and
+                        required_length >= 0):
+                    return [None]
+                return func(obj, *args, **kwargs)
+        wrapper._vqpy_batch = batch
         _vqpy_libfuncs[func.__name__] = (input_fields, output_fields,
                                          past_fields, wrapper)
         for field in output_fields:
@@ -34,5 +66,6 @@ def vqpy_func_logger(input_fields,
                 _vqpy_basefuncs[field] = [func.__name__]
             else:
                 _vqpy_basefuncs[field].append(func.__name__)
+        _vqpy_infer_plans.clear()
         return wrapper
     return decorator
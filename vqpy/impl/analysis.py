@@ -0,0 +1,137 @@
+"""Static analysis of the functions used by VObjs.
+The source of user-defined properties and library functions is inspected to
+find out how they access VObj data, e.g. how many frames back `getv` reads.
+When the answer cannot be decided statically, None is returned and callers
+should fall back to the conservative behavior.
+"""
+
+import ast
+import inspect
+import textwrap
+from typing import Callable, Iterable, List, Optional, Set
+
+
+def _parse(func: Callable) -> Optional[ast.AST]:
+    func = inspect.unwrap(func)
+    try:
+        source = textwrap.dedent(inspect.getsource(func))
+        return ast.parse(source)
+    except (OSError, TypeError, SyntaxError):
+        return None
+
+
+def _getv_calls(tree: ast.AST,
+                accessors=("getv",)) -> Iterable[ast.Call]:
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and
+                isinstance(node.func, ast.Attribute) and
+                node.func.attr in accessors):
+            yield node
+
+
+def _uses_raw_datas(tree: ast.AST) -> bool:
+    return any(isinstance(node, ast.Attribute) and node.attr == "_datas"
+               for node in ast.walk(tree))
+
+
+def getv_lookbacks(func: Callable) -> Optional[List[int]]:
+    """Return how many frames back each `getv` call in `func` reads (1 for
+    the current frame), or None if some of them cannot be decided"""
+    tree = _parse(func)
+    if tree is None or _uses_raw_datas(tree):
+        return None
+    lookbacks = []
+    for call in _getv_calls(tree):
+        index_node = call.args[1] if len(call.args) > 1 else None
+        for keyword in call.keywords:
+            if keyword.arg == "index":
+                index_node = keyword.value
+        if index_node is None:
+            lookbacks.append(1)
+            continue
+        try:
+            index = ast.literal_eval(index_node)
+        except ValueError:
+            return None
+        if not isinstance(index, int):
+            return None
+        lookbacks.append(max(-index, 1))
+    return lookbacks
+
+
+def max_lookback(funcs: Iterable[Callable]) -> Optional[int]:
+    """The maximum `getv` lookback over all functions, None if unknown"""
+    ret = 1
+    for func in funcs:
+        lookbacks = getv_lookbacks(func)
+        if lookbacks is None:
+            return None
+        ret = max([ret] + lookbacks)
+    return ret
+
+
+def vobj_methods(cls: type, base: type) -> List[Callable]:
+    """User-defined functions of a VObj class, up to (excluding) `base`"""
+    ret = []
+    for klass in cls.__mro__:
+        if klass is base or not issubclass(klass, base):
+            continue
+        for value in vars(klass).values():
+            if isinstance(value, (staticmethod, classmethod)):
+                value = value.__func__
+            if inspect.isfunction(value):
+                ret.append(value)
+    return ret
+
+
+def getv_names(func: Callable) -> Optional[Set[str]]:
+    """Return the attribute names `func` reads with `getv` or `infer`, or
+    None if some of them cannot be decided"""
+    tree = _parse(func)
+    if tree is None or _uses_raw_datas(tree):
+        return None
+    names = set()
+    for call in _getv_calls(tree, accessors=("getv", "infer")):
+        attr_node = call.args[0] if len(call.args) > 0 else None
+        for keyword in call.keywords:
+            if keyword.arg == "attr":
+                attr_node = keyword.value
+        if not (isinstance(attr_node, ast.Constant) and
+                isinstance(attr_node.value, str)):
+            return None
+        names.add(attr_node.value)
+    return names
+
+
+def keeps_history(func: Callable) -> bool:
+    """Whether the value of a property depends on it being evaluated in every
+    frame, i.e. it is @stateful, @postproc, or writes attributes itself"""
+    if (getattr(func, "_vqpy_stateful_length", None) is not None or
+            getattr(func, "_vqpy_postproc", False)):
+        return True
+    tree = _parse(func)
+    if tree is None:
+        return True
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and
+                isinstance(node.func, ast.Name) and
+                node.func.id in ("setattr", "delattr")):
+            return True
+        if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) \
+                else [node.target]
+            for target in targets:
+                if any(isinstance(x, ast.Attribute)
+                       for x in ast.walk(target)):
+                    return True
+    return False
+
+
+def reads_frame(func: Callable) -> bool:
+    """Whether `func` may read the frame image other than by `getv`, e.g.
+    through `self._ctx.frame`; True if undecidable"""
+    tree = _parse(func)
+    if tree is None:
+        return True
+    return any(isinstance(node, ast.Attribute) and node.attr == "frame"
+               for node in ast.walk(tree))
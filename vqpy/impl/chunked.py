@@ -0,0 +1,244 @@
+"""Parallel processing of one video split into time chunks.
+Each chunk is processed by its own worker process, with its own FrameStream,
+detector and MultiTracker. A chunk starts `overlap` frames before its first
+frame so that the tracks and VObj histories are warmed up; the outputs of
+the warm-up frames are discarded. The track ids of consecutive chunks are
+then stitched by the IoU of the track boxes over the overlapping frames.
+
+The stitched results approximate a serial run: tracks are matched only when
+they are tracked in both chunks during the overlap, and the state of the
+VObjs (e.g. @stateful values, `continuing` periods) is rebuilt from the
+warm-up frames instead of being carried over.
+"""
+
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..base.query import OUTPUT_TOTAL_VOBJ_NUM_NAME, QueryBase
+from ..detector import setup_detector
+from ..impl.frame import Frame
+from ..impl.output_sink import MemorySink
+from ..impl.runner import run_stream
+from ..utils.video import FrameStream
+
+# (vobj type name, track id, tlbr) of the tracked VObjs of each frame
+TrackBoxesType = Dict[int, List[Tuple[str, int, np.ndarray]]]
+
+# The arguments of the chunk workers, set before the worker processes are
+# forked so that the tasks and VObj types need not be pickled
+_job: Optional[Dict] = None
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> float:
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1])
+    return float(inter / (union - inter))
+
+
+def _process_chunk(warm_start: int, start: int, end: int) -> Dict:
+    job = _job
+    stream = FrameStream(job["video_path"],
+                         **{**job["stream_kwargs"],
+                            "headless": True,
+                            "start_frame": warm_start,
+                            "end_frame": end})
+    detector_name, detector = setup_detector(
+        job["cls_name"],
+        model_dir=job["detector_model_dir"],
+        detector_name=job["detector_name"],
+        detector_kwargs=job["detector_kwargs"])
+    tasks: List[QueryBase] = job["tasks"]
+    sinks = [MemorySink() for _ in tasks]
+    for task, sink in zip(tasks, sinks):
+        task.vqpy_init(sink)
+
+    head: TrackBoxesType = {}
+    tail: TrackBoxesType = {}
+    track_ids = set()
+
+    def on_frame(_, frame: Frame):
+        frame_id = frame.ctx.frame_id
+        boxes = None
+        if frame_id < start:
+            boxes = head.setdefault(frame_id, [])
+        elif frame_id >= end - job["overlap"]:
+            boxes = tail.setdefault(frame_id, [])
+        for vobj_type, ids in frame.tracked_vobj_ids.items():
+            track_ids.update(ids)
+            if boxes is None:
+                continue
+            for track_id in ids:
+                vobj = frame.vobjs[vobj_type][track_id]
+                boxes.append((vobj_type.__name__, track_id,
+                              np.asarray(vobj.getv("tlbr"))))
+        if frame_id == start - 1:
+            # only the VObjs in the frames of this chunk are counted
+            for task in tasks:
+                task._total_ids.clear()
+
+    run_stream(stream, detector, job["cls_name"], job["cls_type"], tasks,
+               on_frame=on_frame, progress=False, **job["run_kwargs"])
+    stream.close()
+    return {
+        "detector_name": detector_name,
+        "records": [[x for x in sink.records if x["frame_id"] >= start]
+                    for sink in sinks],
+        "total_ids": [task._total_ids for task in tasks],
+        "track_ids": track_ids,
+        "head": head,
+        "tail": tail,
+    }
+
+
+def match_tracks(prev_boxes: TrackBoxesType,
+                 cur_boxes: TrackBoxesType,
+                 iou_threshold: float = 0.5) -> Dict[int, int]:
+    """Match the tracks of two chunks by their mean IoU over the frames both
+    chunks cover, greedily from the best pair of the same VObj type.
+    returns: {track id in cur_boxes: track id in prev_boxes}
+    """
+    scores = defaultdict(float)
+    prev_counts = defaultdict(int)
+    cur_counts = defaultdict(int)
+    for frame_id in set(prev_boxes) & set(cur_boxes):
+        for prev_type, prev_id, prev_tlbr in prev_boxes[frame_id]:
+            prev_counts[prev_id] += 1
+            for cur_type, cur_id, cur_tlbr in cur_boxes[frame_id]:
+                if prev_type == cur_type:
+                    scores[(prev_id, cur_id)] += _iou(prev_tlbr, cur_tlbr)
+        for _, cur_id, _ in cur_boxes[frame_id]:
+            cur_counts[cur_id] += 1
+    pairs = sorted(
+        ((score / max(prev_counts[prev_id], cur_counts[cur_id]),
+          prev_id, cur_id) for (prev_id, cur_id), score in scores.items()),
+        key=lambda x: -x[0])
+    ret = {}
+    used = set()
+    for score, prev_id, cur_id in pairs:
+        if score < iou_threshold:
+            break
+        if prev_id in used or cur_id in ret:
+            continue
+        used.add(prev_id)
+        ret[cur_id] = prev_id
+    return ret
+
+
+def merge_periods(prev: List[Tuple], cur: List[Tuple]) -> List[Tuple]:
+    """Merge the `continuing` periods found by two consecutive chunks"""
+    ret = list(prev)
+    for start, end in cur:
+        if len(ret) > 0 and start <= ret[-1][1] + 1:
+            ret[-1] = (min(ret[-1][0], start), max(ret[-1][1], end))
+        else:
+            ret.append((start, end))
+    return ret
+
+
+def _stitch_ids(results: List[Dict]) -> List[Dict[int, int]]:
+    """Map the track ids of each chunk to ids unique over the video"""
+    id_maps = [{x: x for x in results[0]["track_ids"]}]
+    next_id = max(results[0]["track_ids"], default=0) + 1
+    for prev, cur in zip(results, results[1:]):
+        matches = match_tracks(prev["tail"], cur["head"])
+        id_map = {}
+        for track_id in sorted(cur["track_ids"]):
+            if track_id in matches:
+                id_map[track_id] = id_maps[-1][matches[track_id]]
+            else:
+                id_map[track_id] = next_id
+                next_id += 1
+        id_maps.append(id_map)
+    return id_maps
+
+
+def _merge_outputs(task: QueryBase,
+                   index: int,
+                   results: List[Dict],
+                   id_maps: List[Dict[int, int]]
+                   ) -> Tuple[List[Dict], Optional[Dict]]:
+    records = []
+    total_ids = set()
+    # the periods of each (track, key) found by the previous chunks
+    carried: Dict[Tuple, List] = {}
+    for result, id_map in zip(results, id_maps):
+        latest = {}
+        for record in result["records"][index]:
+            for row in record.get("data", []):
+                if "track_id" not in row:
+                    continue
+                track_id = id_map.get(row["track_id"], row["track_id"])
+                row["track_id"] = track_id
+                for key, value in row.items():
+                    if key.endswith("_periods") and value is not None:
+                        row[key] = merge_periods(
+                            carried.get((track_id, key), []), value)
+                        latest[(track_id, key)] = row[key]
+            records.append(record)
+        carried.update(latest)
+        total_ids.update(id_map.get(x, x) for x in result["total_ids"][index])
+    summary = None
+    if task.set_output_configs().output_total_vobj_num:
+        summary = {OUTPUT_TOTAL_VOBJ_NUM_NAME: len(total_ids)}
+    return records, summary
+
+
+def launch_chunked(cls_name,
+                   cls_type: Dict[str, type],
+                   tasks: List[QueryBase],
+                   video_path: str,
+                   num_chunks: int,
+                   overlap: int,
+                   detector_model_dir: str = None,
+                   detector_name: str = None,
+                   detector_kwargs: Optional[Dict] = None,
+                   stream_kwargs: Optional[Dict] = None,
+                   run_kwargs: Optional[Dict] = None,
+                   ) -> Tuple[str, List[Tuple[List[Dict], Optional[Dict]]]]:
+    """Process the video in `num_chunks` parallel chunks overlapping by
+    `overlap` frames, and stitch their outputs.
+    stream_kwargs: extra arguments of the FrameStream of each chunk.
+    run_kwargs: extra arguments of `run_stream` for each chunk.
+    returns: the detector name, and the frame records and the summary
+        (None without total_vobj_num) of each task.
+    """
+    global _job
+    stream = FrameStream(video_path, headless=True)
+    n_frames = stream.n_frames
+    stream.close()
+    chunk_size = max(-(-n_frames // num_chunks), 1)
+    ranges = [(max(start - overlap, 0), start, min(start + chunk_size,
+                                                   n_frames))
+              for start in range(0, n_frames, chunk_size)]
+    _job = {
+        "cls_name": cls_name,
+        "cls_type": cls_type,
+        "tasks": tasks,
+        "video_path": video_path,
+        "overlap": overlap,
+        "detector_model_dir": detector_model_dir,
+        "detector_name": detector_name,
+        "detector_kwargs": detector_kwargs,
+        "stream_kwargs": stream_kwargs or {},
+        "run_kwargs": run_kwargs or {},
+    }
+    try:
+        with ProcessPoolExecutor(
+                max_workers=len(ranges),
+                mp_context=multiprocessing.get_context("fork")) as executor:
+            futures = [executor.submit(_process_chunk, *x) for x in ranges]
+            results = [future.result() for future in futures]
+    finally:
+        _job = None
+    id_maps = _stitch_ids(results)
+    outputs = [_merge_outputs(task, index, results, id_maps)
+               for index, task in enumerate(tasks)]
+    return results[0]["detector_name"], outputs
@@ -0,0 +1,102 @@
+"""Demand analysis deciding which VObj properties are evaluated per frame.
+VObjBase.update used to call every @property on every frame. Properties that
+are not history-dependent are computed lazily by getv when a query reads
+them, so only the history-dependent properties (e.g. @stateful) that some
+query needs, directly or through other properties, have to be evaluated
+eagerly in every frame.
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from ..base.query import QueryBase
+from ..function.logger import _vqpy_basefuncs, _vqpy_libfuncs
+from ..impl.analysis import (
+    getv_names, keeps_history, reads_frame, vobj_methods
+)
+from ..impl.vobj_base import VObjBase
+
+
+def _query_names(tasks: Iterable[QueryBase]) -> Set[str]:
+    names = set()
+    for task in tasks:
+        setting = task.get_setting()
+        names.update(setting.filter_cons.keys())
+        names.update(setting.select_cons.keys())
+    names.discard("__class__")
+    return names
+
+
+def required_names(tasks: Iterable[QueryBase],
+                   vobj_types: Iterable[type]) -> Optional[Set[str]]:
+    """All attribute names the queries need, including the dependencies of
+    the properties and library functions computing them. Returns None when
+    the dependencies cannot be decided."""
+    methods = {}
+    cross_vobj_fields = {}
+    for vobj_type in vobj_types:
+        for name in vobj_type._property_names():
+            methods.setdefault(name, []).append(getattr(vobj_type, name))
+        for name, (_, fields) in \
+                vobj_type._cross_vobj_property_specs().items():
+            cross_vobj_fields.setdefault(name, set()).update(fields or [])
+
+    required = set()
+    waitlist: List[str] = list(_query_names(tasks))
+    while waitlist:
+        name = waitlist.pop()
+        if name in required:
+            continue
+        required.add(name)
+        deps = set(cross_vobj_fields.get(name, []))
+        funcs = list(methods.get(name, []))
+        for libname in _vqpy_basefuncs.get(name, []):
+            input_fields, _, past_fields, libfunc = _vqpy_libfuncs[libname]
+            deps.update(input_fields)
+            deps.update(past_fields)
+            funcs.append(libfunc)
+        for func in funcs:
+            names = getv_names(func)
+            if names is None:
+                return None
+            deps.update(names)
+        waitlist.extend(deps - required)
+    return required
+
+
+def analyze_demand(tasks: Iterable[QueryBase], vobj_types: Iterable[type]
+                   ) -> Dict[type, Optional[FrozenSet[str]]]:
+    """Decide the properties each VObj type evaluates eagerly per frame in
+    a run of the tasks, None to evaluate all of them. The result is set as
+    `eager_names` of the stream of the run, the VObjs read it from there."""
+    vobj_types = set(vobj_types)
+    required = required_names(tasks, vobj_types)
+    ret = {}
+    for vobj_type in vobj_types:
+        if not issubclass(vobj_type, VObjBase):
+            continue
+        if required is None:
+            ret[vobj_type] = None
+            continue
+        ret[vobj_type] = frozenset(
+            name for name in vobj_type._property_names()
+            if name in required and keeps_history(getattr(vobj_type, name))
+        )
+    return ret
+
+
+def needs_pixels(tasks: Iterable[QueryBase],
+                 vobj_types: Iterable[type]) -> bool:
+    """Whether the queries may read the frame images, otherwise the frames
+    need not be decoded when the detection results are known"""
+    vobj_types = set(vobj_types)
+    required = required_names(tasks, vobj_types)
+    if required is None or "frame" in required:
+        return True
+    funcs = []
+    for vobj_type in vobj_types:
+        if issubclass(vobj_type, VObjBase):
+            funcs.extend(vobj_methods(vobj_type, VObjBase))
+    for name in required:
+        for libname in _vqpy_basefuncs.get(name, []):
+            funcs.append(_vqpy_libfuncs[libname][3])
+    return any(reads_frame(func) for func in funcs)
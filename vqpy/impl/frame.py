@@ -14,6 +14,11 @@ class Frame:
             defaultdict(set)
         self.lost_vobj_ids: Dict[VObjGeneratorType, set(int)] = \
             defaultdict(set)
+        # values computed once in this frame and shared by all queries
+        self.cache: Dict = {}
+        # vobjs whose tracks are removed by the tracker in this frame
+        self.removed_vobjs: Dict[VObjGeneratorType,
+                                 List[VObjBaseInterface]] = defaultdict(list)
 
     def set_vobjs(self, vobjs):
         self.vobjs = vobjs
@@ -54,3 +59,17 @@ class Frame:
         id_vobjs = self.vobjs[vobj_type]
         lost_vobjs = [id_vobjs[id] for id in ids]
         return lost_vobjs
+
+    def remove_dead_vobjs(self, vobj_type: VObjGeneratorType):
+        """Evict the vobjs neither tracked nor lost in this frame, i.e. whose
+        tracks have been removed by the tracker"""
+        alive = self.tracked_vobj_ids[vobj_type] | \
+            self.lost_vobj_ids[vobj_type]
+        id_vobjs = self.vobjs[vobj_type]
+        for track_id in [x for x in id_vobjs if x not in alive]:
+            self.removed_vobjs[vobj_type].append(id_vobjs.pop(track_id))
+
+    def get_removed_vobjs(self,
+                          vobj_type: VObjGeneratorType,
+                          ) -> List[VObjBaseInterface]:
+        return self.removed_vobjs[vobj_type]
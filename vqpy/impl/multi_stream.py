@@ -0,0 +1,289 @@
+"""Running queries over several live or recorded streams with one detector.
+Each stream has a reader thread decoding into a small buffer, and its own
+MultiTracker, Frame and tasks. The scheduler takes the buffered frames of the
+streams in round-robin order into shared detector batches. When a stream
+delivers frames faster than they are processed, e.g. a camera under
+overload, its oldest buffered frames are dropped: they are not detected, and
+the tracks are only advanced by the tracker prediction, as for the frames
+skipped by a stride.
+"""
+
+import copy
+import functools
+import json
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Mapping, Optional, Set
+
+from loguru import logger
+
+from ..base.detector import DetectorBase
+from ..base.output_sink import OutputSinkBase
+from ..base.query import QueryBase
+from ..detector import setup_detector
+from ..impl.demand import analyze_demand
+from ..impl.frame import Frame
+from ..impl.multiclass_tracker import MultiTracker
+from ..impl.output_sink import output_prefix, setup_output_sink
+from ..impl.planner import QueryPlanner
+from ..tracker import setup_ground_tracker
+from ..utils.video import FrameStream
+
+
+class _StreamState:
+    """The per-stream state of MultiStreamScheduler"""
+
+    def __init__(self,
+                 stream: FrameStream,
+                 tasks: List[QueryBase],
+                 tracker: MultiTracker,
+                 buffer_size: int,
+                 drop_frames: bool):
+        self.stream = stream
+        self.tasks = tasks
+        self.tracker = tracker
+        self.frame = Frame(stream)
+        self.planner: Optional[QueryPlanner] = None
+        self.buffer_size = buffer_size
+        self.drop_frames = drop_frames
+        # decoded frames in order, None for a frame dropped or skipped
+        self.buffer: Deque = deque()
+        self.n_buffered = 0
+        self.n_dropped = 0
+        self.n_processed = 0
+        self.ended = False
+        self.error: Optional[BaseException] = None
+
+
+class MultiStreamScheduler:
+    """Shares one detector among several streams, each with its own tasks"""
+
+    def __init__(self,
+                 detector: DetectorBase,
+                 cls_name: Mapping[int, str],
+                 cls_type: Dict[str, type],
+                 max_batch_size: int = 8,
+                 tracker_name: str = "byte"):
+        """tracker_name: the ground tracker of each VObj type, see
+        `setup_ground_tracker`."""
+        self.detector = detector
+        self.cls_name = cls_name
+        self.cls_type = cls_type
+        self.max_batch_size = max_batch_size
+        self.tracker_name = tracker_name
+        self._states: List[_StreamState] = []
+        self._cond = threading.Condition()
+        self._next = 0
+
+    def add_stream(self,
+                   stream: FrameStream,
+                   tasks: List[QueryBase],
+                   sinks: Optional[List[OutputSinkBase]] = None,
+                   buffer_size: int = 4,
+                   drop_frames: bool = False) -> List[QueryBase]:
+        """Add a stream with its own copy of the tasks.
+        sinks: the output sink of each task, None keeps the outputs in the
+            tasks.
+        buffer_size: the maximum number of decoded frames waiting.
+        drop_frames: when the buffer is full, drop its oldest frame instead of
+            pausing the decoding, for live streams.
+        returns: the tasks of this stream, initialized with `vqpy_init`
+        """
+        tasks = copy.deepcopy(tasks)
+        if sinks is None:
+            sinks = [None] * len(tasks)
+        for task, sink in zip(tasks, sinks):
+            task.vqpy_init(sink)
+        tracker = MultiTracker(functools.partial(
+            setup_ground_tracker, tracker_name=self.tracker_name),
+            self.cls_name, self.cls_type)
+        self._states.append(_StreamState(stream, tasks, tracker,
+                                         max(buffer_size, 1), drop_frames))
+        return tasks
+
+    def _read(self, state: _StreamState):
+        try:
+            while True:
+                frame_image = state.stream.read()
+                with self._cond:
+                    while (state.n_buffered >= state.buffer_size and
+                           frame_image is not None):
+                        if state.drop_frames:
+                            # frames are dropped oldest first
+                            for i, x in enumerate(state.buffer):
+                                if x is not None:
+                                    state.buffer[i] = None
+                                    break
+                            state.n_buffered -= 1
+                            state.n_dropped += 1
+                        else:
+                            self._cond.wait()
+                    state.buffer.append(frame_image)
+                    if frame_image is not None:
+                        state.n_buffered += 1
+                    self._cond.notify_all()
+        except IOError:
+            pass
+        except BaseException as e:
+            state.error = e
+        with self._cond:
+            state.ended = True
+            self._cond.notify_all()
+
+    def _ended(self, finished: Set[int]) -> List[int]:
+        """The streams ended and fully processed, but not finished yet"""
+        return [index for index, state in enumerate(self._states)
+                if index not in finished and state.ended and
+                len(state.buffer) == 0]
+
+    def _take(self, finished: Set[int]) -> Dict[int, List]:
+        """Take the frames of the next detector batch, round-robin over the
+        streams, waiting until any stream has frames or has ended.
+        returns: the frames taken from each stream in order"""
+        taken: Dict[int, List] = {}
+        with self._cond:
+            while not any(len(x.buffer) > 0 for x in self._states):
+                if len(self._ended(finished)) > 0:
+                    return taken
+                self._cond.wait()
+            n_images = 0
+            n_streams = len(self._states)
+            progressed = True
+            while n_images < self.max_batch_size and progressed:
+                progressed = False
+                for i in range(n_streams):
+                    index = (self._next + i) % n_streams
+                    state = self._states[index]
+                    frames = taken.setdefault(index, [])
+                    # the frames without images are processed right away
+                    while len(state.buffer) > 0:
+                        frame_image = state.buffer.popleft()
+                        frames.append(frame_image)
+                        if frame_image is not None:
+                            state.n_buffered -= 1
+                            n_images += 1
+                            progressed = True
+                            break
+                    if n_images >= self.max_batch_size:
+                        break
+            self._next = (self._next + 1) % n_streams
+            self._cond.notify_all()
+        return taken
+
+    def _process(self, state: _StreamState, frame_image, outputs):
+        state.stream.advance(frame_image)
+        if outputs is None:
+            state.frame = state.tracker.predict(state.frame)
+        else:
+            state.frame = state.tracker.update(outputs, state.frame)
+            state.planner.update(state.frame)
+        state.n_processed += 1
+
+    def run(self):
+        """Process all streams until each of them ends"""
+        for state in self._states:
+            state.stream.eager_names = analyze_demand(
+                state.tasks, self.cls_type.values())
+            state.planner = QueryPlanner(state.tasks)
+        readers = [threading.Thread(target=self._read, args=(x,), daemon=True)
+                   for x in self._states]
+        for reader in readers:
+            reader.start()
+        finished: Set[int] = set()
+        while True:
+            with self._cond:
+                ended = self._ended(finished)
+            for index in ended:
+                finished.add(index)
+                self._finish(self._states[index])
+            if len(finished) == len(self._states):
+                break
+            taken = self._take(finished)
+            images = [x for index in sorted(taken) for x in taken[index]
+                      if x is not None]
+            if len(images) == 0:
+                outputs = []
+            elif len(images) == 1:
+                outputs = [self.detector.inference(images[0])]
+            else:
+                outputs = self.detector.inference_batch(images)
+            outputs = iter(outputs)
+            for index in sorted(taken):
+                state = self._states[index]
+                for frame_image in taken[index]:
+                    self._process(state, frame_image, None if frame_image
+                                  is None else next(outputs))
+
+    def _finish(self, state: _StreamState):
+        if state.error is not None:
+            logger.error(f"Stream stopped by {state.error!r}")
+        for task in state.tasks:
+            task.vqpy_finish(state.frame)
+        state.tracker.close()
+        state.stream.close()
+        logger.info(f"Stream finished with {state.n_processed} frames, "
+                    f"{state.n_dropped} dropped")
+
+
+def launch_streams(cls_name,
+                   cls_type: Dict[str, type],
+                   tasks: List[QueryBase],
+                   sources: List[str],
+                   save_folder: str = None,
+                   detector_model_dir: str = None,
+                   detector_name: str = "yolox",
+                   detector_kwargs: Optional[Dict] = None,
+                   max_batch_size: int = 8,
+                   buffer_size: int = 4,
+                   drop_frames: bool = False,
+                   output_format: str = "jsonl",
+                   stream_kwargs: Optional[Dict] = None,
+                   tracker_name: str = "byte",
+                   ) -> List[List[QueryBase]]:
+    """Launch the VQPy tasks on each of the sources (video files, or URLs
+    and pipes opened by OpenCV) sharing one detector.
+    drop_frames: drop frames of the sources processed slower than they
+        deliver frames, see `MultiStreamScheduler.add_stream`.
+    stream_kwargs: extra arguments of the FrameStream of each source.
+    tracker_name: the ground tracker of each VObj type, see
+        `setup_ground_tracker`.
+    returns: the tasks of each source
+    """
+    detector_name, detector = setup_detector(cls_name,
+                                             model_dir=detector_model_dir,
+                                             detector_name=detector_name,
+                                             detector_kwargs=detector_kwargs)
+    scheduler = MultiStreamScheduler(detector, cls_name, cls_type,
+                                     max_batch_size=max_batch_size,
+                                     tracker_name=tracker_name)
+    streaming = output_format != "json" and bool(save_folder)
+    if save_folder:
+        os.makedirs(save_folder, exist_ok=True)
+    source_tasks = []
+    source_paths = []
+    for source in sources:
+        # the streams are never shown, and opened before their sinks
+        stream = FrameStream(source,
+                             **{**(stream_kwargs or {}), "headless": True})
+        paths = [None] * len(tasks)
+        if save_folder:
+            paths = [output_prefix(save_folder, source,
+                                   task.get_base_setting().filename,
+                                   detector_name)
+                     for task in tasks]
+        sinks = None
+        if streaming:
+            sinks = [setup_output_sink(output_format, x) for x in paths]
+        source_tasks.append(scheduler.add_stream(
+            stream, tasks, sinks, buffer_size=buffer_size,
+            drop_frames=drop_frames))
+        source_paths.append(paths)
+    scheduler.run()
+    if save_folder and not streaming:
+        for stream_tasks, paths in zip(source_tasks, source_paths):
+            for task, path in zip(stream_tasks, paths):
+                with open(path + ".json", 'w') as f:
+                    json.dump(task.vqpy_getdata(), f)
+    logger.info("Done!")
+    return source_tasks
@@ -0,0 +1,160 @@
+"""Running the same queries over many videos with a pool of processes.
+The worker processes are forked after the libraries (e.g. torch) have been
+imported, so the imported code is shared copy-on-write, and each worker
+loads the detector weights once in its initializer and reuses them for all
+the videos scheduled on it.
+"""
+
+import copy
+import json
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from loguru import logger
+from tqdm import tqdm
+
+from ..base.query import QueryBase
+from ..detector import setup_detector
+from ..impl.output_sink import output_prefix, setup_output_sink
+from ..impl.runner import run_stream
+from ..utils.video import FrameStream
+
+# The arguments of the workers, set before the worker processes are forked
+_job: Optional[Dict] = None
+# The detector of this worker process, loaded by `_init_worker`
+_detector = None
+_detector_name: Optional[str] = None
+
+
+def _init_worker():
+    global _detector, _detector_name
+    _detector_name, _detector = setup_detector(
+        _job["cls_name"],
+        model_dir=_job["detector_model_dir"],
+        detector_name=_job["detector_name"],
+        detector_kwargs=_job["detector_kwargs"])
+
+
+def _process_video(video_path: str) -> List:
+    job = _job
+    save_folder = job["save_folder"]
+    output_format = job["output_format"]
+    streaming = output_format != "json" and bool(save_folder)
+    tasks: List[QueryBase] = copy.deepcopy(job["tasks"])
+    for task in tasks:
+        task.vqpy_init()
+    paths = [None] * len(tasks)
+    if save_folder:
+        paths = [output_prefix(save_folder, video_path,
+                               task.get_setting().filename, _detector_name)
+                 for task in tasks]
+    if streaming:
+        for task, path in zip(tasks, paths):
+            task.vqpy_set_sink(setup_output_sink(output_format, path))
+
+    progress = job["progress"]
+    n_reported = 0
+
+    def report(n_processed: int, _):
+        nonlocal n_reported
+        if n_processed - n_reported >= job["report_interval"]:
+            with progress.get_lock():
+                progress.value += n_processed - n_reported
+            n_reported = n_processed
+
+    # the workers never show the frames
+    stream = FrameStream(video_path,
+                         **{**job["stream_kwargs"], "headless": True})
+    if not stream.is_opened():
+        raise IOError(f"Failed to open {video_path}")
+    run_stream(stream, _detector, job["cls_name"], job["cls_type"], tasks,
+               on_frame=report, progress=False, **job["run_kwargs"])
+    with progress.get_lock():
+        progress.value += stream.n_frames - n_reported
+    stream.close()
+
+    if save_folder and not streaming:
+        for task, path in zip(tasks, paths):
+            with open(path + ".json", 'w') as f:
+                json.dump(task.vqpy_getdata(), f)
+    return [task.vqpy_getdata() for task in tasks]
+
+
+def launch_many(cls_name,
+                cls_type: Dict[str, type],
+                tasks: List[QueryBase],
+                video_paths: List[str],
+                save_folder: str = None,
+                num_workers: Optional[int] = None,
+                detector_model_dir: str = None,
+                detector_name: str = "yolox",
+                detector_kwargs: Optional[Dict] = None,
+                output_format: str = "jsonl",
+                stream_kwargs: Optional[Dict] = None,
+                run_kwargs: Optional[Dict] = None,
+                report_interval: int = 30,
+                ) -> Dict[str, Optional[List]]:
+    """Launch the VQPy tasks on each of the videos, scheduled over
+    `num_workers` processes (the number of CPUs by default).
+    Each video gets its own copy of the tasks, and the outputs of each
+    video are saved to save_folder as `launch` does.
+    stream_kwargs: extra arguments of the FrameStream of each video, e.g.
+        `stride` or `prefetch`.
+    run_kwargs: extra arguments of `run_stream` for each video, e.g.
+        `detect_batch_size`.
+    report_interval: the number of frames between the progress updates of
+        a worker.
+    returns: the `vqpy_getdata()` of the tasks on each video, which is empty
+        when streamed to files; None for a video that failed.
+    """
+    global _job
+    if save_folder:
+        os.makedirs(save_folder, exist_ok=True)
+    total_frames = 0
+    for video_path in video_paths:
+        stream = FrameStream(video_path, headless=True)
+        total_frames += stream.n_frames
+        stream.close()
+
+    context = multiprocessing.get_context("fork")
+    progress = context.Value("q", 0)
+    _job = {
+        "cls_name": cls_name,
+        "cls_type": cls_type,
+        "tasks": tasks,
+        "save_folder": save_folder,
+        "detector_model_dir": detector_model_dir,
+        "detector_name": detector_name,
+        "detector_kwargs": detector_kwargs,
+        "output_format": output_format,
+        "stream_kwargs": stream_kwargs or {},
+        "run_kwargs": run_kwargs or {},
+        "progress": progress,
+        "report_interval": report_interval,
+    }
+    results: Dict[str, Optional[List]] = {}
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers,
+                                 mp_context=context,
+                                 initializer=_init_worker) as executor, \
+                tqdm(total=total_frames) as bar:
+            futures = {executor.submit(_process_video, video_path): video_path
+                       for video_path in video_paths}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5,
+                                     return_when=FIRST_COMPLETED)
+                bar.update(progress.value - bar.n)
+                for future in done:
+                    video_path = futures[future]
+                    try:
+                        results[video_path] = future.result()
+                    except Exception:
+                        logger.exception(f"Failed to process {video_path}")
+                        results[video_path] = None
+    finally:
+        _job = None
+    logger.info("Done!")
+    return results
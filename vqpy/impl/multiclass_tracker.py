@@ -2,7 +2,12 @@
 this tracker separate objects by their classes, and tracks individually
 """
 
-from typing import Callable, Dict, List, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from ..base.detections import Detections, as_detections
 from ..base.ground_tracker import GroundTrackerBase
 from ..base.surface_tracker import SurfaceTrackerBase
 
@@ -21,49 +26,123 @@ class MultiTracker(SurfaceTrackerBase):
     def __init__(self,
                  tracker: TrackerGeneratorType,
                  cls_name: Mapping[int, str],
-                 cls_type: Mapping[str, VObjGeneratorType]):
-        """TODO: complete the __init__ docstring"""
+                 cls_type: Mapping[str, VObjGeneratorType],
+                 max_workers: Optional[int] = None):
+        """
+        tracker: creates the ground tracker of each VObj type from the
+            stream, when the type is first detected.
+        cls_name: the class name of each class id of the detector.
+        cls_type: the VObj type of each class name to track, the detections
+            of other classes are dropped. Classes of the same VObj type are
+            tracked together.
+        max_workers: the threads updating the trackers of different VObj
+            types concurrently, 1 to update them one after another. None
+            uses the default of ThreadPoolExecutor. The threads are only
+            started with several VObj types, and stopped by `close`.
+        """
         self.tracker = tracker
         self.cls_name = cls_name
         self.cls_type = cls_type
         self.tracker_dict: Dict[VObjGeneratorType, GroundTrackerBase] = {}
         self.vobj_pool: Dict[int, VObjBase] = {}
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+        # the VObj types, and the index of the type of each class id
+        # (-1 for the classes without a VObj type)
+        self.types: List[VObjGeneratorType] = []
+        items = (cls_name.items() if isinstance(cls_name, Mapping)
+                 else enumerate(cls_name))
+        type_index = {}
+        for class_id, name in items:
+            if name in cls_type:
+                func = cls_type[name]
+                if func not in self.types:
+                    self.types.append(func)
+                type_index[class_id] = self.types.index(func)
+        self.type_index = np.full(max(type_index, default=-1) + 1, -1)
+        for class_id, index in type_index.items():
+            self.type_index[class_id] = index
+
+    def _map(self, func: Callable, jobs: List) -> List:
+        """func of each job, on the thread pool if there are several jobs
+        and all trackers can run concurrently"""
+        # no threads with a single VObj type
+        concurrent = len(self.types) > 1 and self.max_workers != 1 and all(
+            x.concurrent_update for x in self.tracker_dict.values())
+        if len(jobs) <= 1 or not concurrent:
+            return [func(*job) for job in jobs]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.max_workers,
+                                            thread_name_prefix="tracker")
+        return list(self._pool.map(lambda job: func(*job), jobs))
+
+    def close(self):
+        """Stop the threads updating the trackers, if started"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
-    def update(self, output: List[Dict], last_frame: Frame) -> Frame:
+    def _type_of(self, class_id: np.ndarray) -> np.ndarray:
+        """The index of the VObj type of each class id, -1 for none"""
+        class_id = np.asarray(class_id, dtype=np.int64)
+        known = (class_id >= 0) & (class_id < len(self.type_index))
+        return np.where(known, self.type_index[np.where(known, class_id, 0)],
+                        -1)
+
+    def update(self, output: Detections, last_frame: Frame) -> Frame:
         """Generate the video objects using ground tracker and detection result
         returns: the current tracked/lost VObj instances"""
-        detections: Dict[VObjGeneratorType, List[Dict]] = {}
+        output = as_detections(output)
 
         last_frame_vobjs = last_frame.vobjs
         ctx = last_frame.ctx
         frame = Frame(ctx)
         frame.set_vobjs(last_frame_vobjs)
 
-        for obj in output:
-            name = self.cls_name[obj['class_id']]
-            if name not in self.cls_type:
-                continue
-            func = self.cls_type[name]
-            if func not in detections:
-                detections[func] = []
-            detections[func].append(obj)
-
-        for func, dets in detections.items():
-            if func not in self.tracker_dict:
+        # the trackers are created in the order their types are detected
+        det_type = self._type_of(output.class_id)
+        detected, first = np.unique(det_type, return_index=True)
+        for index in detected[np.argsort(first)].tolist():
+            func = self.types[index] if index >= 0 else None
+            if func is not None and func not in self.tracker_dict:
                 self.tracker_dict[func] = self.tracker(ctx)
 
+        jobs: List[Tuple[GroundTrackerBase, Detections]] = []
         for func, tracker in self.tracker_dict.items():
-            # logger.info(f"Multitracking type {func}")
-            dets = []
-            if func in detections:
-                dets = detections[func]
-            f_tracked, f_lost = tracker.update(dets)
-            ctx._objdatas = f_tracked
-            for item in f_tracked:
-                track_id = item['track_id']
-                frame.update_vobjs(func, track_id, item)
-            for item in f_lost:
-                track_id = item['track_id']
-                frame.update_vobjs(func, track_id, None)
-            # logger.info(f"tracking done")
+            jobs.append((tracker,
+                         output[det_type == self.types.index(func)]))
+        if all(tracker.concurrent_update for tracker, _ in jobs):
+            # the track ids are taken in the order of the trackers
+            for tracker, dets in jobs:
+                tracker.reserve_track_ids(dets)
+        results = self._map(lambda tracker, dets: tracker.update(dets), jobs)
+        for func, (f_tracked, f_lost) in zip(self.tracker_dict, results):
+            self._update_vobjs(frame, func, f_tracked, f_lost)
         return frame
+
+    def predict(self, last_frame: Frame) -> Frame:
+        """Advance the video objects to a frame without detection results,
+        the tracked VObjs are updated with their predicted locations
+        returns: the current tracked/lost VObj instances"""
+        frame = Frame(last_frame.ctx)
+        frame.set_vobjs(last_frame.vobjs)
+        results = self._map(lambda tracker: tracker.predict(),
+                            [(x,) for x in self.tracker_dict.values()])
+        for func, (f_tracked, f_lost) in zip(self.tracker_dict, results):
+            self._update_vobjs(frame, func, f_tracked, f_lost)
+        return frame
+
+    @staticmethod
+    def _update_vobjs(frame: Frame,
+                      func: VObjGeneratorType,
+                      f_tracked: List[Dict],
+                      f_lost: List[Dict]):
+        frame.ctx._objdatas = f_tracked
+        for item in f_tracked:
+            track_id = item['track_id']
+            frame.update_vobjs(func, track_id, item)
+        for item in f_lost:
+            track_id = item['track_id']
+            frame.update_vobjs(func, track_id, None)
+        frame.remove_dead_vobjs(func)
@@ -0,0 +1,242 @@
+"""Output sink implementations"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..base.output_sink import OutputSinkBase
+
+
+class MemorySink(OutputSinkBase):
+    """Keeps all records in memory, mainly for tests"""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self.summary: Optional[Dict] = None
+
+    def write(self, record: Dict):
+        self.records.append(record)
+
+    def write_summary(self, summary: Dict):
+        self.summary = summary
+
+
+class JSONLinesSink(OutputSinkBase):
+    """Appends one JSON line per frame record, the summary is the last line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'w')
+
+    def write(self, record: Dict):
+        self._file.write(json.dumps(record) + "\n")
+
+    def write_summary(self, summary: Dict):
+        self.write(summary)
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ColumnarSink(OutputSinkBase):
+    """Buffers records into columns and appends them as blocks of typed
+    column arrays.
+
+    There are two column tables: "frames" has one row per record ("frame_id",
+    "vobj_num"), "rows" has one row per selected VObj ("frame_id" and one
+    column per key of select_cons). Blocks are written every `block_size`
+    records. The file is a sequence of .npy arrays, written without pickle:
+    each block of a table is a JSON header {"table", "columns", "json"},
+    stored as a 0-d string array, then one array per column. A column of
+    numbers, booleans or equally shaped vectors (e.g. tlbr) is a numeric
+    array; a column of strings is a string array; any other column, e.g.
+    with missing values or lists of periods, is a string array of JSON values
+    listed in "json". The summary is a JSON header {"summary"} alone.
+    Use `read_columnar` to load the file.
+    """
+
+    def __init__(self, path: str, block_size: int = 256):
+        self.path = path
+        self.block_size = block_size
+        self._file = open(path, 'wb')
+        self._reset()
+
+    def _reset(self):
+        self._n_records = 0
+        self._frames: Dict[str, List] = {"frame_id": [], "vobj_num": []}
+        self._rows: Dict[str, List] = {"frame_id": []}
+
+    def write(self, record: Dict):
+        frame_id = record.get("frame_id")
+        self._frames["frame_id"].append(frame_id)
+        self._frames["vobj_num"].append(record.get("vobj_num"))
+        for row in record.get("data", []):
+            n_rows = len(self._rows["frame_id"])
+            self._rows["frame_id"].append(frame_id)
+            for key, value in row.items():
+                # a key missing in earlier rows is padded with None
+                self._rows.setdefault(key, [None] * n_rows).append(value)
+        n_rows = len(self._rows["frame_id"])
+        for values in self._rows.values():
+            values.extend([None] * (n_rows - len(values)))
+        self._n_records += 1
+        if self._n_records >= self.block_size:
+            self.flush()
+
+    def _save(self, header: Dict, arrays: List[np.ndarray] = ()):
+        np.save(self._file, np.array(json.dumps(header)), allow_pickle=False)
+        for array in arrays:
+            np.save(self._file, array, allow_pickle=False)
+
+    def _write_table(self, table: str, columns: Dict[str, List]):
+        arrays = {key: _to_array(values) for key, values in columns.items()}
+        self._save({"table": table,
+                    "columns": list(arrays),
+                    "json": [key for key, array in arrays.items()
+                             if array is None]},
+                   [array if array is not None else
+                    np.array([json.dumps(x) for x in columns[key]], dtype=str)
+                    for key, array in arrays.items()])
+
+    def write_summary(self, summary: Dict):
+        self.flush()
+        self._save({"summary": summary})
+
+    def flush(self):
+        if self._file.closed:
+            return
+        if self._n_records > 0:
+            self._write_table("frames", self._frames)
+            self._write_table("rows", self._rows)
+            self._reset()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def _to_array(values: List) -> Optional[np.ndarray]:
+    """The typed array of a column, None if it has no numeric or string
+    dtype, e.g. with None values or ragged lists"""
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        return None
+    if array.dtype.kind in "biuf":
+        return array
+    if array.dtype.kind == "U" and all(isinstance(x, str) for x in values):
+        return array
+    return None
+
+
+def _object_array(values: List) -> np.ndarray:
+    ret = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        ret[i] = value
+    return ret
+
+
+def _concat_columns(parts: List[Optional[np.ndarray]],
+                    n_rows: List[int]) -> np.ndarray:
+    """Concatenate the blocks of a column, None for a block without it.
+    The result is an object array unless all blocks with rows are typed
+    arrays of the same kind and shape of rows."""
+    kept = [(x, n) for x, n in zip(parts, n_rows) if n > 0]
+    arrays = [x for x, _ in kept]
+    if all(x is not None and x.dtype != object for x in arrays) and \
+            len({(x.dtype.kind, x.shape[1:]) for x in arrays}) == 1:
+        return np.concatenate(arrays)
+    values = []
+    for part, n in kept:
+        values.extend([None] * n if part is None else part.tolist())
+    return _object_array(values)
+
+
+def read_columnar(path: str) -> Dict:
+    """Load a file written by ColumnarSink into the concatenated columns.
+    The numeric and string columns are typed arrays, the others are object
+    arrays of the JSON values, with None where a block lacks the column.
+    The file is read without pickle.
+    returns: {"frames": columns, "rows": columns, "summary": summary}
+    """
+    blocks: Dict[str, List[Dict[str, np.ndarray]]] = {"frames": [],
+                                                      "rows": []}
+    summary = None
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                header = json.loads(np.load(f, allow_pickle=False).item())
+            except EOFError:
+                break
+            if "summary" in header:
+                summary = header["summary"]
+                continue
+            block = {}
+            for key in header["columns"]:
+                array = np.load(f, allow_pickle=False)
+                if key in header["json"]:
+                    array = _object_array([json.loads(x)
+                                           for x in array.tolist()])
+                block[key] = array
+            blocks[header["table"]].append(block)
+    ret = {"summary": summary}
+    for table, table_blocks in blocks.items():
+        keys = dict.fromkeys(["frame_id", "vobj_num"] if table == "frames"
+                             else ["frame_id"])
+        for block in table_blocks:
+            keys.update(dict.fromkeys(block))
+        n_rows = [len(x["frame_id"]) for x in table_blocks]
+        ret[table] = {key: _concat_columns(
+                          [x.get(key) for x in table_blocks], n_rows)
+                      for key in keys}
+    return ret
+
+
+_sink_types = {
+    "jsonl": (JSONLinesSink, "jsonl"),
+    "columnar": (ColumnarSink, "npy"),
+}
+
+
+def setup_output_sink(output_format: str, path_prefix: str) -> OutputSinkBase:
+    """Create a file sink of the given format at `path_prefix` + extension"""
+    if output_format not in _sink_types:
+        raise ValueError(f"Output format {output_format} is not supported, "
+                         f"choose from {list(_sink_types.keys())}")
+    sink_type, extension = _sink_types[output_format]
+    return sink_type(f"{path_prefix}.{extension}")
+
+
+def save_outputs(output_format: str,
+                 path_prefix: str,
+                 records: List[Dict],
+                 summary: Optional[Dict] = None):
+    """Save complete query outputs at once in the given format, "json" being
+    the layout of `QueryBase.vqpy_getdata` with the summary first"""
+    if output_format == "json":
+        with open(f"{path_prefix}.json", 'w') as f:
+            json.dump(([summary] if summary is not None else []) + records, f)
+        return
+    sink = setup_output_sink(output_format, path_prefix)
+    for record in records:
+        sink.write(record)
+    if summary is not None:
+        sink.write_summary(summary)
+    sink.close()
+
+
+def output_prefix(save_folder: str,
+                  video_path: str,
+                  task_name: str,
+                  detector_name: str) -> str:
+    """The path of the outputs of a query on a video, without extension"""
+    video_name = os.path.basename(video_path).split(".")[0]
+    return os.path.join(save_folder,
+                        f"{video_name}_{task_name}_{detector_name}")
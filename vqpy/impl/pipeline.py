@@ -0,0 +1,113 @@
+"""Pipelined execution of the per-frame stages.
+Each stage runs on its own worker thread and hands its results to the next
+stage through a bounded queue, so that e.g. decoding the next frames overlaps
+with detecting the current one. Heavy stages (video decoding, ONNX Runtime,
+PyTorch) release the GIL, hence the threads make progress concurrently.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+_END = object()
+
+
+class _Failure:
+    """Carries an exception raised in a worker to the consumer"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class Pipeline:
+    """Chain of stages connected by bounded FIFO queues.
+    Every stage has exactly one worker, hence the items leave the pipeline in
+    the same order as they are produced by the source. A full queue blocks
+    the upstream worker (back-pressure), bounding the frames in flight.
+    """
+
+    def __init__(self,
+                 source: Iterable,
+                 stages: List[Callable[[Any], Any]],
+                 queue_size: int = 4):
+        """
+        source: the iterable producing the inputs of the first stage, it is
+            consumed in a worker of its own.
+        stages: the functions applied in order on each item.
+        queue_size: the maximum number of items waiting between two stages.
+        """
+        if queue_size < 1:
+            raise ValueError("queue_size of a pipeline should be positive")
+        self._stop = threading.Event()
+        self._queues = [queue.Queue(maxsize=queue_size)
+                        for _ in range(len(stages) + 1)]
+        self._workers = [threading.Thread(target=self._produce,
+                                          args=(iter(source),),
+                                          daemon=True)]
+        for i, stage in enumerate(stages):
+            self._workers.append(threading.Thread(
+                target=self._transform,
+                args=(stage, self._queues[i], self._queues[i + 1]),
+                daemon=True))
+        for worker in self._workers:
+            worker.start()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _produce(self, source: Iterator):
+        try:
+            for item in source:
+                if not self._put(self._queues[0], item):
+                    return
+        except BaseException as e:
+            self._put(self._queues[0], _Failure(e))
+            return
+        self._put(self._queues[0], _END)
+
+    def _transform(self, stage: Callable, q_in: queue.Queue,
+                   q_out: queue.Queue):
+        while True:
+            item = self._get(q_in)
+            if item is _END or isinstance(item, _Failure):
+                self._put(q_out, item)
+                return
+            try:
+                result = stage(item)
+            except BaseException as e:
+                self._put(q_out, _Failure(e))
+                return
+            if not self._put(q_out, result):
+                return
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._get(self._queues[-1])
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exc
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop all workers, pending items are dropped"""
+        self._stop.set()
+        for worker in self._workers:
+            worker.join()
@@ -0,0 +1,73 @@
+"""Shared execution of several queries on the same frames.
+Within a frame, the values every query computes are kept in `Frame.cache`:
+inferred VObj attributes, properties gathered for @cross_vobj_property and
+the VObj type each query selects. The planner additionally finds the filter
+conditions that are equivalent across queries, e.g. the conditions of a
+common base query, so that their results are computed once per VObj per
+frame and fanned out to every query using them.
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+from ..base.interface import FrameInterface
+from ..base.query import QueryBase
+
+
+def _signature(func: Callable) -> Optional[Tuple]:
+    """The code and captured values of a function, None if unavailable"""
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return None
+    try:
+        cells = tuple(cell.cell_contents for cell in func.__closure__ or ())
+    except ValueError:
+        # an empty cell
+        return None
+    return code, func.__defaults__, cells
+
+
+def _same(a: Tuple, b: Tuple) -> bool:
+    try:
+        return bool(a == b)
+    except Exception:
+        # e.g. comparing numpy arrays
+        return False
+
+
+class QueryPlanner:
+    """Runs the queries of one launch on each frame, sharing the common
+    computation of their constraints"""
+
+    def __init__(self, tasks: List[QueryBase]):
+        """tasks should have been initialized with `vqpy_init`"""
+        self.tasks = tasks
+        self.n_shared = 0
+        signatures: List[Tuple[str, Tuple, Tuple]] = []
+
+        def share(name: str, func: Callable, key: Tuple) -> Tuple:
+            signature = _signature(func)
+            if signature is None:
+                return key
+            for other_name, other_signature, other_key in signatures:
+                if name == other_name and _same(signature, other_signature):
+                    self.n_shared += 1
+                    return other_key
+            signatures.append((name, signature, key))
+            return key
+
+        for task in tasks:
+            setting = task.get_setting()
+            setting._class_key = share("__class__",
+                                       setting.filter_cons["__class__"],
+                                       setting._class_key)
+            for stage in setting._plan:
+                for predicate in stage:
+                    if predicate.is_barrier:
+                        # continuing keeps state of its own per query
+                        continue
+                    predicate.key = share(predicate.property_name,
+                                          predicate.func, predicate.key)
+
+    def update(self, frame: FrameInterface):
+        for task in self.tasks:
+            task.vqpy_update(frame)
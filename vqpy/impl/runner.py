@@ -0,0 +1,125 @@
+"""Running the queries over the frames of one video stream"""
+
+import functools
+import itertools
+from typing import Callable, Dict, List, Mapping, Optional
+
+from tqdm import tqdm
+
+from ..base.detector import DetectorBase
+from ..base.query import QueryBase
+from ..detector.cache import DetectionCache
+from ..impl.demand import analyze_demand
+from ..impl.frame import Frame
+from ..impl.multiclass_tracker import MultiTracker
+from ..impl.pipeline import Pipeline
+from ..impl.planner import QueryPlanner
+from ..tracker import setup_ground_tracker
+from ..utils.video import FrameStream
+
+FrameCallbackType = Callable[[int, Frame], None]
+
+
+def run_stream(stream: FrameStream,
+               detector: Optional[DetectorBase],
+               cls_name: Mapping[int, str],
+               cls_type: Dict[str, type],
+               tasks: List[QueryBase],
+               pipeline: bool = False,
+               pipeline_queue_size: int = 4,
+               detect_batch_size: int = 1,
+               on_frame: Optional[FrameCallbackType] = None,
+               progress: bool = True,
+               detection_cache: Optional[DetectionCache] = None,
+               decode_frames: bool = True,
+               tracker_name: str = "byte",
+               ) -> Frame:
+    """Detect, track and run the queries on every frame of the stream.
+    tasks should have been initialized with `vqpy_init`, and are finished
+    after the last frame, or with the latest frame when the run stops early,
+    e.g. on an error or when the user quits, so that their sinks are closed.
+    on_frame: called with the number of frames processed (from 1) and the
+        current Frame after the queries of each frame.
+    detection_cache: the detection results are read from the cache when
+        cached, and added to it otherwise.
+    decode_frames: when False, the frames are not read at all, which
+        requires all detection results to be cached. The detector can then
+        be None.
+    tracker_name: the ground tracker of each VObj type, see
+        `setup_ground_tracker`.
+    returns: the Frame of the last frame
+    """
+    # Now tracking is always performed by track each class separately
+    frame = Frame(stream)
+    tracker = MultiTracker(functools.partial(setup_ground_tracker,
+                                             tracker_name=tracker_name),
+                           cls_name, cls_type)
+    stream.eager_names = analyze_demand(tasks, cls_type.values())
+    planner = QueryPlanner(tasks)
+
+    def decode():
+        for start in range(0, stream.n_frames, detect_batch_size):
+            end = min(start + detect_batch_size, stream.n_frames)
+            # (frame index in the video, image, whether it is analyzed)
+            yield [(stream.start_frame + i,
+                    stream.read() if decode_frames else None,
+                    stream.is_analyzed(i))
+                   for i in range(start, end)]
+
+    def detect(frames):
+        # frames skipped by the stride get no outputs
+        outputs = [None] * len(frames)
+        missed = []
+        for i, (index, image, analyzed) in enumerate(frames):
+            if not analyzed:
+                continue
+            if detection_cache is not None:
+                outputs[i] = detection_cache.get(index)
+            if outputs[i] is None:
+                missed.append(i)
+        images = [frames[i][1] for i in missed]
+        results = []
+        if len(images) == 1:
+            results = [detector.inference(images[0])]
+        elif len(images) > 1:
+            results = detector.inference_batch(images)
+        for i, result in zip(missed, results):
+            outputs[i] = result
+            if detection_cache is not None:
+                detection_cache.put(frames[i][0], result)
+        return [(image, output)
+                for (_, image, _), output in zip(frames, outputs)]
+
+    workers = None
+    if pipeline:
+        workers = Pipeline(decode(), [detect], pipeline_queue_size)
+        detected = workers
+    else:
+        detected = map(detect, decode())
+
+    detected = itertools.chain.from_iterable(detected)
+    if progress:
+        detected = tqdm(detected, total=stream.n_frames)
+    unfinished = list(tasks)
+    try:
+        for n_processed, (frame_image, outputs) in \
+                enumerate(detected, start=1):
+            stream.advance(frame_image)
+            if outputs is None:
+                frame = tracker.predict(frame)
+            else:
+                frame = tracker.update(outputs, frame)
+                planner.update(frame)
+            if n_processed == stream.n_frames:
+                while unfinished:
+                    unfinished.pop(0).vqpy_finish(frame)
+            if on_frame is not None:
+                on_frame(n_processed, frame)
+    finally:
+        if workers is not None:
+            # stop decoding before the stream can be closed
+            workers.close()
+        tracker.close()
+        while unfinished:
+            unfinished.pop(0).vqpy_finish(frame)
+    return frame
@@ -1,9 +1,13 @@
 """VObjBase implementation"""
 
-from typing import Dict, List, Optional, Set
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 from ..base.interface import VObjBaseInterface
-from ..function import infer
+from ..function import infer, infer_plan, is_batched, run_plan_batch
+from ..function.logger import _vqpy_libfuncs
+from ..impl.analysis import max_lookback, vobj_methods
+from ..utils.ring_buffer import RingBuffer
 from ..utils.video import FrameStream
 
 
@@ -12,30 +16,156 @@ class VObjBase(VObjBaseInterface):
     The tracker is responsible to keep objects updated when the track is active
     """
 
+    # Number of past frames of data kept, i.e. the maximum k of getv(attr, -k)
+    # in use. When None, it is inferred from the getv calls of the VObj
+    # methods and library functions, and from the @stateful lengths; all data
+    # is kept if the inference fails.
+    history_length: Optional[int] = None
+    # The registered @property names that are @stateful
+    _stateful_names: FrozenSet[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # the public @property and @cross_vobj_property methods, shared by
+        # all instances
+        cls._registered_names = frozenset(
+            name for name in cls._property_names() if name[0] != '_')
+        cls._registered_cross_vobj_names = MappingProxyType({
+            name: spec
+            for name, spec in cls._cross_vobj_property_specs().items()
+            if name[0] != '_'})
+        cls._stateful_names = frozenset(
+            name for name in cls._registered_names
+            if getattr(getattr(cls, name), "_vqpy_stateful_length",
+                       None) is not None)
+
     def __init__(self, ctx: FrameStream):
         self._ctx = ctx
         self._start_idx = ctx.frame_id
+        # The @property names evaluated in every update, set by the demand
+        # analysis of the queries run on the stream. None evaluates all.
+        self._eager_names: Optional[FrozenSet[str]] = \
+            getattr(ctx, "eager_names", {}).get(type(self))
         self._track_length = 0
-        self._datas: List[Optional[Dict]] = []
-        self._registered_names: Set[str] = set()
-        self._registered_cross_vobj_names: Dict[str, ] = {}
+        self._datas: RingBuffer = RingBuffer(self._history_capacity())
+        self._data_fields: List[str] = []
         self._working_infers: List[str] = []
-        # NOTE: now @property instances are stored in the order of __dir__()
-        for instance_name in self.__dir__():
-            instance = getattr(self, instance_name)
-            if instance_name[0] != '_' and callable(instance):
-                try:
-                    instance()
-                except TypeError:
-                    pass
+        self._infer_memo: Dict[Tuple, object] = {}
+        self._infer_memo_index: Optional[int] = None
+        # _get_fields() and _get_pfields(), once they no longer change
+        self._fields: Optional[FrozenSet[str]] = None
+        self._pfields: Optional[FrozenSet[str]] = None
+
+    @classmethod
+    def _history_capacity(cls) -> Optional[int]:
+        if "_vqpy_history_capacity" in cls.__dict__:
+            return cls._vqpy_history_capacity
+        capacity = cls.history_length
+        if capacity is None:
+            methods = vobj_methods(cls, VObjBase)
+            libfuncs = [func for _, _, _, func in _vqpy_libfuncs.values()]
+            capacity = max_lookback(methods + libfuncs)
+            if capacity is not None:
+                capacity = max([capacity] + [
+                    getattr(method, "_vqpy_stateful_length", 0)
+                    for method in methods])
+        cls._vqpy_history_capacity = capacity
+        return capacity
+
+    @classmethod
+    def _property_names(cls) -> List[str]:
+        """Names of the @property methods of this class"""
+        return [name for name in dir(cls)
+                if getattr(getattr(cls, name, None), "_vqpy_property", False)]
+
+    @classmethod
+    def _cross_vobj_property_specs(cls) -> Dict[str, Tuple]:
+        """(vobj_type, vobj_input_fields) of each @cross_vobj_property"""
+        ret = {}
+        for name in dir(cls):
+            spec = getattr(getattr(cls, name, None), "_vqpy_cross_vobj", None)
+            if spec is not None:
+                ret[name] = spec
+        return ret
 
     def _get_fields(self):
-        return list(self._datas[0].keys()) + \
+        return self._data_fields + \
             list(self._registered_names) + self._ctx.output_fields
 
     def _get_pfields(self):
-        return list(self._datas[0].keys()) + [x for x in self._registered_names
-                                              if hasattr(self, '__state_' + x)]
+        return self._data_fields + [x for x in self._registered_names
+                                    if hasattr(self, '__state_' + x)]
+
+    def _field_sets(self) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """_get_fields() and _get_pfields() as frozensets, kept once the data
+        fields are known and all @stateful properties have values"""
+        if self._pfields is not None:
+            return self._fields, self._pfields
+        fields = frozenset(self._get_fields())
+        pfields = frozenset(self._get_pfields())
+        if len(self._data_fields) > 0 and self._stateful_names <= pfields:
+            self._fields, self._pfields = fields, pfields
+        return fields, pfields
+
+    def _infer_memo_key(self,
+                        attr: str,
+                        specifications: Optional[Dict[str, str]]) -> Tuple:
+        """The key of the value of attr inferred in this frame, the values
+        of the previous frames are dropped"""
+        if self._infer_memo_index != self._ctx.frame_id:
+            self._infer_memo.clear()
+            self._infer_memo_index = self._ctx.frame_id
+        return (attr, None if specifications is None else
+                tuple(sorted(specifications.items())))
+
+    def _infers(self, attr: str) -> bool:
+        """Whether getv(attr) of this frame infers attr"""
+        if hasattr(self, '__static_' + attr):
+            return False
+        idx = self._ctx.frame_id - self._start_idx
+        if idx < 0 or idx > len(self._datas):
+            return False
+        if (idx < len(self._datas) and self._datas[idx] is not None and
+                attr in self._datas[idx]):
+            return False
+        return not (
+            attr in self._ctx.output_fields or
+            (hasattr(self, '__record_' + attr) and
+             getattr(self, '__index_' + attr) == self._ctx.frame_id) or
+            attr in self._registered_names)
+
+    @staticmethod
+    def batch_infer(objs: List[VObjBaseInterface], attr: str):
+        """Infer attr of this frame for the VObjs whose getv(attr) would, as
+        getv does, but calling each library function logged with batch=True
+        once for the VObjs sharing an infer plan. The values are kept for the
+        getv calls of this frame."""
+        groups: Dict[int, Tuple] = {}
+        for obj in objs:
+            if (not isinstance(obj, VObjBase) or len(obj._datas) == 0 or
+                    len(obj._working_infers) > 0 or not obj._infers(attr)):
+                continue
+            memo_key = obj._infer_memo_key(attr, None)
+            if memo_key in obj._infer_memo:
+                continue
+            fields, pfields = obj._field_sets()
+            nfields = fields - {attr} if attr in fields else fields
+            plan = infer_plan(attr, nfields, pfields)
+            if plan is None or not is_batched(plan):
+                continue
+            groups.setdefault(id(plan), (plan, []))[1].append(obj)
+        for plan, group in groups.values():
+            for obj in group:
+                obj._working_infers.append(attr)
+            try:
+                values = run_plan_batch(group, plan)
+            finally:
+                for obj in group:
+                    obj._working_infers.pop()
+            for obj, value in zip(group, values):
+                if value is None:
+                    value = getattr(obj, attr, None)
+                obj._infer_memo[(attr, None)] = value
 
     def getv(self,
              attr: str,
@@ -79,16 +209,24 @@ class VObjBase(VObjBaseInterface):
                 return getattr(self, attr)()    # TODO: test if used at all
             else:
                 assert len(self._datas) > 0
+                # inferred values are shared by all queries in this frame
+                memo_key = None
+                if len(self._working_infers) == 0:
+                    memo_key = self._infer_memo_key(attr, specifications)
+                    if memo_key in self._infer_memo:
+                        return self._infer_memo[memo_key]
                 self._working_infers.append(attr)
                 # Avoid circular calls when inferring by remove working infers
-                nfields = [x for x in self._get_fields()
-                           if x not in self._working_infers]
-                pfields = self._get_pfields()
+                fields, pfields = self._field_sets()
+                nfields = (fields if fields.isdisjoint(self._working_infers)
+                           else fields.difference(self._working_infers))
                 value = infer(self, attr, nfields, pfields, specifications)
                 self._working_infers.pop()
                 # following handles built-in case like __class__
                 if value is None:
                     value = getattr(self, attr, None)
+                if memo_key is not None:
+                    self._infer_memo[memo_key] = value
                 return value
         elif hasattr(self, '__state_' + attr):
             values = getattr(self, '__state_' + attr)
@@ -107,18 +245,23 @@ class VObjBase(VObjBaseInterface):
     def update(self, data: Optional[Dict]):
         """Update data this frame to object"""
         if data is not None:
+            if len(self._data_fields) == 0:
+                self._data_fields = list(data.keys())
             self._datas.append(data.copy())
             self._track_length += 1
         else:
             self._datas.append(None)
             self._track_length = 0
+        eager_names = self._eager_names
         for method_name in self._registered_names:
-            # properties updated here
-            getattr(self, method_name)()
+            # properties updated here, the others are computed by getv
+            # on demand
+            if eager_names is None or method_name in eager_names:
+                getattr(self, method_name)()
 
     def infer(self,
               attr: str,
               specifications: Optional[Dict[str, str]] = None):
         """A easy-to-use interface provided for usage of built-in functions"""
-        return infer(self, attr, self._get_fields(), self._get_pfields(),
-                     specifications)
+        fields, pfields = self._field_sets()
+        return infer(self, attr, fields, pfields, specifications)
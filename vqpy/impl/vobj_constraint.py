@@ -1,11 +1,67 @@
 from __future__ import annotations
 
+import time
 from typing import Callable, Dict, List, Optional
 from ..base.interface import \
     VObjBaseInterface, VObjConstraintInterface, FrameInterface
+from ..impl.vobj_base import VObjBase
 from ..utils.filters import continuing
 
 
+class _Predicate:
+    """A filter condition with runtime statistics, tracked as exponential
+    moving averages of its cost per VObj and of its pass rate"""
+
+    DECAY = 0.1
+
+    def __init__(self, property_name: str, func: Callable):
+        self.property_name = property_name
+        self.func = func
+        # continuing keeps per-VObj state, it must see the same VObjs as in
+        # the declared order of filter_cons
+        self.is_barrier = isinstance(func, continuing)
+        self.cost = 0.0
+        self.pass_rate = 1.0
+        # identifies the results in the frame cache, equivalent predicates
+        # of different queries share the key (see impl/planner.py)
+        self.key = (property_name, id(self))
+
+    def __call__(self, obj: VObjBaseInterface) -> bool:
+        if self.is_barrier:
+            # patch work to support vqpy.utils.continuing since
+            # VObj and the property name need to be passed as arguments
+            return self.func(obj, self.property_name)
+        it = obj.getv(self.property_name)
+        return it is not None and self.func(it)
+
+    def apply(self, objs: List[VObjBaseInterface],
+              cache: Dict) -> List[VObjBaseInterface]:
+        start = time.perf_counter()
+        if self.is_barrier:
+            VObjBase.batch_infer(objs, self.property_name)
+            ret = [obj for obj in objs if self(obj)]
+        else:
+            results = cache.setdefault(self.key, {})
+            # batched library functions run once for the VObjs to evaluate
+            VObjBase.batch_infer([obj for obj in objs
+                                  if id(obj) not in results],
+                                 self.property_name)
+            ret = []
+            for obj in objs:
+                if id(obj) not in results:
+                    results[id(obj)] = self(obj)
+                if results[id(obj)]:
+                    ret.append(obj)
+        elapsed = time.perf_counter() - start
+        self.cost += self.DECAY * (elapsed / len(objs) - self.cost)
+        self.pass_rate += self.DECAY * (len(ret) / len(objs) - self.pass_rate)
+        return ret
+
+    def rank(self) -> float:
+        """Expected cost to reject a VObj, lower runs first"""
+        return self.cost / max(1.0 - self.pass_rate, 1e-6)
+
+
 class VObjConstraint(VObjConstraintInterface):
     """The constraint on VObj instances, helpful when applying queries"""
 
@@ -35,6 +91,30 @@ class VObjConstraint(VObjConstraintInterface):
         self.select_cons = {key: (lambda x: x) if func is None
                             else func for (key, func) in select_cons.items()}
         self.filename = filename
+        self._plan = self._compile_filter(self.filter_cons)
+        # identifies the "__class__" filter in the frame cache, queries with
+        # an equivalent filter share the key (see impl/planner.py)
+        self._class_key = ("__class__", id(self))
+
+    @staticmethod
+    def _compile_filter(filter_cons: Dict[str, Callable]) \
+            -> List[List[_Predicate]]:
+        """Compile the filter constraints into stages of predicates. Within
+        each stage the predicates can be reordered freely; a continuing
+        predicate forms a stage of its own, keeping its declared position."""
+        plan: List[List[_Predicate]] = [[]]
+        for property_name, func in filter_cons.items():
+            if property_name == "__class__":
+                # skip filters about "__class__" since we already used it
+                # to only include VObjs of the desired type
+                continue
+            predicate = _Predicate(property_name, func)
+            if predicate.is_barrier:
+                plan.append([predicate])
+                plan.append([])
+            else:
+                plan[-1].append(predicate)
+        return [stage for stage in plan if stage]
 
     def __add__(self, other: VObjConstraint) -> VObjConstraint:
         """merge constraints in the form subclass + superclass"""
@@ -42,7 +122,8 @@ class VObjConstraint(VObjConstraintInterface):
         # merge filter constraints
         for key, cond in other.filter_cons.items():
             if key in filter_cons:
-                filter_cons[key] = lambda x: filter_cons[key](x) and cond(x)
+                filter_cons[key] = (lambda x, a=filter_cons[key], b=cond:
+                                    a(x) and b(x))
             else:
                 filter_cons[key] = cond
         # always use select_cons in derived class
@@ -60,12 +141,16 @@ class VObjConstraint(VObjConstraintInterface):
         filter_func = self.filter_cons["__class__"]
         # get the first VObj type that satisfies the filter function,
         # should be the desired VObj type
-        vobj_type = next((
-                vobj_type
-                for vobj_type in frame.vobjs.keys() if filter_func(vobj_type)
-            ),
-            None
-        )
+        cache_key = ("vobj_type", self._class_key)
+        if cache_key not in frame.cache:
+            frame.cache[cache_key] = next((
+                    vobj_type
+                    for vobj_type in frame.vobjs.keys()
+                    if filter_func(vobj_type)
+                ),
+                None
+            )
+        vobj_type = frame.cache[cache_key]
         # all VObjs of the desired type
         vobjs = frame.get_tracked_vobjs(vobj_type)
 
@@ -74,25 +159,15 @@ class VObjConstraint(VObjConstraintInterface):
             frame, vobjs, self.filter_cons.keys()
         )
 
-        ret: List[VObjBaseInterface] = []
-        for obj in vobjs:
-            ok = True
-            for property_name, func in self.filter_cons.items():
-                if property_name == "__class__":
-                    # skip filters about "__class__" since we already used it
-                    # to only include VObjs of the desired type
-                    continue
-                if type(func) == continuing:
-                    # patch work to support vqpy.utils.continuing since
-                    # VObj and the property name need to be passed as arguments
-                    ok = func(obj, property_name)
-                else:
-                    it = obj.getv(property_name)
-                    if it is None or not func(it):
-                        ok = False
-                        break
-            if ok:
-                ret.append(obj)
+        # predicates are applied one at a time on the VObjs passing all
+        # previous ones, cheap and selective predicates first
+        ret: List[VObjBaseInterface] = vobjs
+        for stage in self._plan:
+            for predicate in stage:
+                if len(ret) == 0:
+                    return ret
+                ret = predicate.apply(ret, frame.cache)
+            stage.sort(key=_Predicate.rank)
         return ret
 
     def select(self, objs: List[VObjBaseInterface], frame: FrameInterface) \
@@ -104,6 +179,8 @@ class VObjConstraint(VObjConstraintInterface):
         self._compute_cross_vobj_property(
             frame, objs, self.select_cons.keys() - self.filter_cons.keys()
         )
+        for key in self.select_cons:
+            VObjBase.batch_infer(objs, key)
         return [{key: postproc(x.getv(key))
                  for key, postproc in self.select_cons.items()}
                 for x in objs]
@@ -148,16 +225,21 @@ class VObjConstraint(VObjConstraintInterface):
                 continue
             other_vobj_type, other_vobj_input_fields = \
                 vobjs[0]._registered_cross_vobj_names[cross_vobj_property]
-            other_vobjs = frame.get_tracked_vobjs(other_vobj_type)
-            properties = []
-            for other_vobj in other_vobjs:
-                properties.append(
-                    tuple(
-                        other_vobj.getv(input_field)
-                        for input_field in other_vobj_input_fields
+            # the gathered properties are shared by all queries in the frame
+            cache_key = ("cross_vobj_args", other_vobj_type,
+                         tuple(other_vobj_input_fields))
+            if cache_key not in frame.cache:
+                other_vobjs = frame.get_tracked_vobjs(other_vobj_type)
+                properties = []
+                for other_vobj in other_vobjs:
+                    properties.append(
+                        tuple(
+                            other_vobj.getv(input_field)
+                            for input_field in other_vobj_input_fields
+                        )
                     )
-                )
-            cross_vobj_args[cross_vobj_property] = properties
+                frame.cache[cache_key] = properties
+            cross_vobj_args[cross_vobj_property] = frame.cache[cache_key]
 
         # for each vobj, compute value of cross_vobj_property
         for obj in vobjs:
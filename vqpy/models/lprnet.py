@@ -2,6 +2,7 @@
 
 # Provided interface:
 # GetLP: infer the license plate from the image of a car
+# GetLPs: GetLP of a batch of images
 
 import torch
 import numpy as np
@@ -61,6 +62,12 @@ def network_setup():
 
 
 def GetLP(image):
+    return GetLPs([image])[0]
+
+
+def GetLPs(images):
+    """GetLP of each image, with one LPRNet forward pass for the license
+    plate candidates of all images"""
     from models.lpdetect.LPRNet.LPRNet_Test import decode as lprnet_decode
     from models.lpdetect.MTCNN.MTCNN import detect_pnet, detect_onet
 
@@ -68,29 +75,36 @@ def GetLP(image):
 
     if device is None:
         network_setup()
-    if image is None:
-        return None
-    bboxes = detect_pnet(pnet, image, mini_lp, device)
-    bboxes = detect_onet(onet, image, bboxes, device)
-    if len(bboxes) == 0:
-        return None
-    bboxes = bboxes[np.argsort(-bboxes[:, 4])]
-    for i in range(len(bboxes)):
-        bbox = bboxes[i, :4]
-        img_box = crop_image(image, bbox)
-        if img_box is None:
+    # the candidates of each image, in the order they are tried
+    owners, ims = [], []
+    for index, image in enumerate(images):
+        if image is None:
             continue
-        im = cv2.resize(img_box, (94, 24), interpolation=cv2.INTER_CUBIC)
-        im = (np.transpose(np.float32(im), (2, 0, 1)) - 127.5)*0.0078125
-        # data.size is torch.Size([1, 3, 24, 94])
-        data = torch.from_numpy(im).float().unsqueeze(0).to(device)
-        transfer = stnet(data)
-        preds = lprnet(transfer)
-        preds = preds.cpu().detach().numpy()  # (1, 68, 18)
-        labels, _ = lprnet_decode(preds, CHARS_ASCII)
-        labels = labels[0]
-        if len(labels) < 7:
+        bboxes = detect_pnet(pnet, image, mini_lp, device)
+        bboxes = detect_onet(onet, image, bboxes, device)
+        if len(bboxes) == 0:
             continue
-        return labels
+        bboxes = bboxes[np.argsort(-bboxes[:, 4])]
+        for i in range(len(bboxes)):
+            bbox = bboxes[i, :4]
+            img_box = crop_image(image, bbox)
+            if img_box is None:
+                continue
+            im = cv2.resize(img_box, (94, 24), interpolation=cv2.INTER_CUBIC)
+            im = (np.transpose(np.float32(im), (2, 0, 1)) - 127.5)*0.0078125
+            owners.append(index)
+            ims.append(im)
 
-    return None
+    rets = [None] * len(images)
+    if len(ims) == 0:
+        return rets
+    # data.size is torch.Size([N, 3, 24, 94])
+    data = torch.from_numpy(np.stack(ims)).float().to(device)
+    transfer = stnet(data)
+    preds = lprnet(transfer)
+    preds = preds.cpu().detach().numpy()  # (N, 68, 18)
+    labels, _ = lprnet_decode(preds, CHARS_ASCII)
+    for index, label in zip(owners, labels):
+        if rets[index] is None and len(label) >= 7:
+            rets[index] = label
+    return rets
@@ -4,10 +4,20 @@ All visible instances in this folder inherits (base/ground_tracker.py).
 """
 from ..utils.video import FrameStream
 
+from .array_byte_tracker import ArrayByteTracker
 from .byte_tracker import ByteTracker
 
+_ground_trackers = {
+    "byte": ByteTracker,
+    # the same results as "byte", scaling to thousands of objects
+    "byte_array": ArrayByteTracker,
+}
 
-def setup_ground_tracker(ctx: FrameStream):
+
+def setup_ground_tracker(ctx: FrameStream, tracker_name: str = "byte"):
     """Pickup appropriate ground-level tracker"""
     # TODO: add automatic tracker selection interface here
-    return ByteTracker(ctx)
+    if tracker_name not in _ground_trackers:
+        raise ValueError(f"Unknown tracker {tracker_name}, choose from "
+                         f"{list(_ground_trackers.keys())}")
+    return _ground_trackers[tracker_name](ctx)
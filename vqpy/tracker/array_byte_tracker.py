@@ -0,0 +1,301 @@
+"""ByteTracker with the states of all tracks kept in arrays.
+The tracks are the rows of contiguous arrays: the Kalman means (N, 8) and
+covariances (N, 8, 8), the boxes, scores, ids and bookkeeping columns. The
+rows are ordered as the tracked tracks followed by the lost tracks, so that
+the track lists of ByteTracker become ranges and index arrays, and the
+Kalman filter predicts, updates and initiates all tracks of a step at once.
+The association is the same as ByteTracker's, so are the results.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..base.detections import Detections, as_detections
+from ..base.ground_tracker import GroundTrackerBase
+from ..utils.video import FrameStream
+
+from . import matching
+from .base_track import TrackIdAllocator, TrackState
+from .kalman_filter import KalmanFilter
+
+
+def tlbr_to_xyah(tlbr: np.ndarray) -> np.ndarray:
+    """Convert the (N, 4) boxes to `(center x, center y, aspect ratio,
+    height)`, where the aspect ratio is `width / height`."""
+    ret = np.array(tlbr, dtype=np.float64).reshape(-1, 4)
+    ret[:, 2:] -= ret[:, :2]
+    ret[:, :2] += ret[:, 2:] / 2
+    ret[:, 2] /= ret[:, 3]
+    return ret
+
+
+def xyah_to_tlbr(xyah: np.ndarray) -> np.ndarray:
+    """Convert the (N, 4) `(center x, center y, aspect ratio, height)` to
+    boxes `(min x, min y, max x, max y)`."""
+    ret = np.array(xyah, dtype=np.float64).reshape(-1, 4)
+    ret[:, 2] *= ret[:, 3]
+    ret[:, :2] -= ret[:, 2:] / 2
+    ret[:, 2:] += ret[:, :2]
+    return ret
+
+
+def _fuse_score(cost_matrix: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    if cost_matrix.size == 0:
+        return cost_matrix
+    return 1 - (1 - cost_matrix) * scores[np.newaxis, :]
+
+
+def _assign(cost_matrix: np.ndarray, thresh: float
+            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """`matching.linear_assignment` with all results as int arrays"""
+    matches, unmatched_a, unmatched_b = \
+        matching.linear_assignment(cost_matrix, thresh)
+    return (np.asarray(matches, dtype=np.int64).reshape(-1, 2),
+            np.asarray(unmatched_a, dtype=np.int64),
+            np.asarray(unmatched_b, dtype=np.int64))
+
+
+def _ordered_union(*rows: np.ndarray) -> np.ndarray:
+    """The rows in order of their first occurrence"""
+    rows = np.concatenate(rows)
+    _, first = np.unique(rows, return_index=True)
+    return rows[np.sort(first)]
+
+
+class ArrayByteTracker(GroundTrackerBase):
+    """ByteTracker for many concurrent objects, see the module docstring"""
+
+    input_fields = ["tlbr", "score"]
+    output_fields = ["track_id"]
+    concurrent_update = True
+
+    # the per-track arrays, with their row shapes and types
+    _columns = {
+        "mean": ((8,), np.float64),
+        "covariance": ((8, 8), np.float64),
+        "tlbr": ((4,), np.float64),
+        "score": ((), np.float64),
+        "track_id": ((), np.int64),
+        "state": ((), np.int64),
+        "is_activated": ((), bool),
+        "frame_id": ((), np.int64),
+        "start_frame": ((), np.int64),
+        "tracklet_len": ((), np.int64),
+    }
+
+    def __init__(self, ctx: FrameStream):
+        self.ctx = ctx
+
+        self.track_thresh = 0.6
+        self.det_thresh = self.track_thresh + 0.1
+        self.match_thresh = 0.9
+        self.buffer_size = int(ctx.fps / 30.0 * 30)
+        self.max_time_lost = self.buffer_size
+        self.kalman_filter = KalmanFilter()
+        self.track_ids = TrackIdAllocator()
+
+        for name, (shape, dtype) in self._columns.items():
+            setattr(self, name, np.zeros((0,) + shape, dtype=dtype))
+        # the data of the latest detection of each track
+        self.data: List[Dict] = []
+        # the first n_tracked rows are the tracked tracks, the others lost
+        self.n_tracked = 0
+        # the ids of the removed tracks still tracked or lost, the tracks
+        # removed in a frame stay lost until the next frame
+        self.removed_ids = np.zeros(0, dtype=np.int64)
+
+    def _multipredict(self, rows: np.ndarray):
+        if len(rows) > 0:
+            multi_mean = self.mean[rows]
+            multi_mean[self.state[rows] != TrackState.Tracked, 7] = 0
+            prediction = self.kalman_filter.multi_predict(
+                multi_mean, self.covariance[rows])
+            self.mean[rows], self.covariance[rows] = prediction
+
+    def _update(self,
+                frame_id: int,
+                rows: np.ndarray,
+                dets: Detections,
+                det_rows: np.ndarray,
+                reactivate: np.ndarray):
+        """Update the tracks of the rows with the detections of det_rows"""
+        if len(rows) == 0:
+            return
+        for row, det_row in zip(rows.tolist(), det_rows.tolist()):
+            self.data[row] = dets[det_row]
+        self.score[rows] = dets.score[det_rows]
+        self.tracklet_len[rows] = np.where(reactivate, 0,
+                                           self.tracklet_len[rows] + 1)
+        self.state[rows] = TrackState.Tracked
+        self.is_activated[rows] = True
+        self.frame_id[rows] = frame_id
+        prediction = self.kalman_filter.multi_update(
+            self.mean[rows], self.covariance[rows],
+            tlbr_to_xyah(dets.tlbr[det_rows]))
+        self.mean[rows], self.covariance[rows] = prediction
+        self.tlbr[rows] = xyah_to_tlbr(self.mean[rows, :4])
+
+    def _initiate(self,
+                  frame_id: int,
+                  dets: Detections,
+                  det_rows: np.ndarray,
+                  track_ids: np.ndarray) -> np.ndarray:
+        """Append the new tracks of the detections of det_rows
+        returns: the rows of the new tracks"""
+        n_new = len(det_rows)
+        mean, covariance = self.kalman_filter.multi_initiate(
+            tlbr_to_xyah(dets.tlbr[det_rows]))
+        new = {
+            "mean": mean,
+            "covariance": covariance,
+            "tlbr": dets.tlbr[det_rows],
+            "score": dets.score[det_rows],
+            "track_id": track_ids,
+            "state": np.full(n_new, TrackState.Tracked),
+            "is_activated": np.full(n_new, frame_id == 1),
+            "frame_id": np.full(n_new, frame_id),
+            "start_frame": np.full(n_new, frame_id),
+            "tracklet_len": np.zeros(n_new),
+        }
+        n_rows = len(self.track_id)
+        for name, (shape, dtype) in self._columns.items():
+            column = np.asarray(new[name], dtype=dtype).reshape(
+                (n_new,) + shape)
+            setattr(self, name, np.concatenate([getattr(self, name),
+                                                column]))
+        self.data.extend(dets[x] for x in det_rows.tolist())
+        return np.arange(n_rows, n_rows + n_new)
+
+    def _select(self, tracked: np.ndarray, lost: np.ndarray):
+        """Keep only the rows of the tracked and then the lost tracks"""
+        rows = np.concatenate([tracked, lost])
+        for name in self._columns:
+            setattr(self, name, getattr(self, name)[rows])
+        self.data = [self.data[x] for x in rows.tolist()]
+        self.n_tracked = len(tracked)
+
+    def _remove_duplicates(self, tracked: np.ndarray, lost: np.ndarray
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+        pdist = matching.iou_distance(self.tlbr[tracked], self.tlbr[lost])
+        p, q = np.where(pdist < 0.15)
+        age = self.frame_id - self.start_frame
+        older = age[tracked[p]] > age[lost[q]]
+        tracked = np.delete(tracked, p[~older])
+        lost = np.delete(lost, q[older])
+        return tracked, lost
+
+    def _extract_data(self, rows: np.ndarray) -> List[Dict]:
+        rets = []
+        for row, track_id in zip(rows.tolist(),
+                                 self.track_id[rows].tolist()):
+            ret = self.data[row].copy()
+            ret["track_id"] = track_id
+            rets.append(ret)
+        return rets
+
+    def update(self, data: Detections) -> Tuple[List[Dict], List[Dict]]:
+        frame_id = self.ctx.frame_id
+        dets = as_detections(data)
+        # each detection takes a track id as in ByteTracker, used if it
+        # starts a new track
+        track_ids = self.track_ids.take(len(dets))
+
+        n_tracks = len(self.track_id)
+        tracked = np.arange(self.n_tracked)
+        lost = np.arange(self.n_tracked, n_tracks)
+        tracked_state = TrackState.Tracked
+
+        dets_high = np.flatnonzero(dets.score > self.track_thresh)
+        dets_low = np.flatnonzero((dets.score <= self.track_thresh) &
+                                  (dets.score > 0.1))
+
+        '''Step 1: Add newly detected tracklets to tracked_stracks'''
+        activated = self.is_activated[tracked]
+        unconfirmed = tracked[~activated]
+
+        ''' Step 2: First association, with high score detection boxes'''
+        strack_pool = np.concatenate([tracked[activated], lost])
+        # Predict the current location with KF
+        self._multipredict(strack_pool)
+        dists = matching.iou_distance(self.tlbr[strack_pool],
+                                      dets.tlbr[dets_high])
+        dists = _fuse_score(dists, dets.score[dets_high])
+        matches, u_track, u_detection = _assign(dists, self.match_thresh)
+
+        rows = strack_pool[matches[:, 0]]
+        refound = self.state[rows] != tracked_state
+        self._update(frame_id, rows, dets, dets_high[matches[:, 1]],
+                     reactivate=refound)
+        activated_rows = [rows[~refound]]
+        refind_rows = rows[refound]
+
+        ''' Step 3: Second association, with low score detection boxes'''
+        # association the untrack to the low score detections
+        r_tracked = strack_pool[u_track]
+        r_tracked = r_tracked[self.state[r_tracked] == tracked_state]
+        dists = matching.iou_distance(self.tlbr[r_tracked],
+                                      dets.tlbr[dets_low])
+        matches, u_track, _ = _assign(dists, 0.5)
+        rows = r_tracked[matches[:, 0]]
+        self._update(frame_id, rows, dets, dets_low[matches[:, 1]],
+                     reactivate=np.zeros(len(rows), dtype=bool))
+        activated_rows.append(rows)
+
+        lost_rows = r_tracked[u_track]
+        self.state[lost_rows] = TrackState.Lost
+
+        '''Deal with unconfirmed tracks, usually tracks with only one
+        beginning frame'''
+        dets_rem = dets_high[u_detection]
+        dists = matching.iou_distance(self.tlbr[unconfirmed],
+                                      dets.tlbr[dets_rem])
+        dists = _fuse_score(dists, dets.score[dets_rem])
+        matches, u_unconfirmed, u_detection = _assign(dists, 0.7)
+        rows = unconfirmed[matches[:, 0]]
+        self._update(frame_id, rows, dets, dets_rem[matches[:, 1]],
+                     reactivate=np.zeros(len(rows), dtype=bool))
+        activated_rows.append(rows)
+        removed_rows = [unconfirmed[u_unconfirmed]]
+
+        """ Step 4: Init new stracks"""
+        new_dets = dets_rem[u_detection]
+        new_dets = new_dets[dets.score[new_dets] >= self.det_thresh]
+        activated_rows.append(self._initiate(frame_id, dets, new_dets,
+                                             track_ids[new_dets]))
+
+        """ Step 5: Update state"""
+        removed_rows.append(
+            lost[frame_id - self.frame_id[lost] > self.max_time_lost])
+        removed_rows = np.concatenate(removed_rows)
+        self.state[removed_rows] = TrackState.Removed
+
+        tracked = tracked[self.state[tracked] == tracked_state]
+        tracked = _ordered_union(tracked, *activated_rows, refind_rows)
+        lost = lost[~np.isin(lost, tracked)]
+        lost = np.concatenate([lost, lost_rows])
+        lost = lost[~np.isin(self.track_id[lost], self.removed_ids)]
+        removed_ids = np.union1d(self.removed_ids,
+                                 self.track_id[removed_rows])
+        tracked, lost = self._remove_duplicates(tracked, lost)
+        self._select(tracked, lost)
+        self.removed_ids = removed_ids[np.isin(removed_ids, self.track_id)]
+
+        return (self._extract_data(np.arange(self.n_tracked)),
+                self._extract_data(np.arange(self.n_tracked,
+                                             len(self.track_id))))
+
+    def reserve_track_ids(self, data: Detections):
+        self.track_ids.reserve(len(data))
+
+    def predict(self) -> Tuple[List[Dict], List[Dict]]:
+        tracked = np.arange(self.n_tracked)
+        lost = np.arange(self.n_tracked, len(self.track_id))
+        activated = tracked[self.is_activated[tracked]]
+        self._multipredict(np.concatenate([activated, lost]))
+        # matched against the next detections from here
+        self.tlbr[activated] = xyah_to_tlbr(self.mean[activated, :4])
+        rets = self._extract_data(tracked)
+        for ret, tlbr in zip(rets, self.tlbr[tracked]):
+            ret["tlbr"] = tlbr
+        return rets, self._extract_data(lost)
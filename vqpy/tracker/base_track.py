@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class TrackState(object):
     New = 0
     Tracked = 1
@@ -39,3 +42,26 @@ class BaseTrack(object):
 
     def mark_removed(self):
         self.state = TrackState.Removed
+
+
+class TrackIdAllocator(object):
+    """The track ids of a ground tracker, taken from the global count of
+    BaseTrack. The ids of an update can be reserved ahead of it, so that
+    trackers updating concurrently take the same ids as one after another.
+    """
+
+    def __init__(self):
+        self._reserved = None
+
+    def reserve(self, n: int):
+        """Reserve the next n ids for the next `take`"""
+        self._reserved = BaseTrack._count + 1 + np.arange(n)
+        BaseTrack._count += n
+
+    def take(self, n: int) -> np.ndarray:
+        """The reserved ids if there are n of them, otherwise the next n"""
+        ids, self._reserved = self._reserved, None
+        if ids is None or len(ids) != n:
+            ids = BaseTrack._count + 1 + np.arange(n)
+            BaseTrack._count += n
+        return ids
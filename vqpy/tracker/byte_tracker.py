@@ -3,11 +3,13 @@ from __future__ import annotations
 from typing import Dict, List, Tuple
 
 import numpy as np
+from ..base.detections import Detections
 from ..base.ground_tracker import GroundTrackerBase
 from ..utils.video import FrameStream
 
 from . import matching
-from .base_track import BaseTrack, TrackState
+from .array_byte_tracker import tlbr_to_xyah, xyah_to_tlbr
+from .base_track import BaseTrack, TrackIdAllocator, TrackState
 from .kalman_filter import KalmanFilter
 
 
@@ -16,21 +18,22 @@ class ByteTracker(GroundTrackerBase):
 
     input_fields = ["tlbr", "score"]
     output_fields = ["track_id"]
+    concurrent_update = True
 
     class Data(BaseTrack):
-        def __init__(self, data: Dict):
+        def __init__(self, data: Dict, track_id: int = None):
             """Create an instance of ByteTracker Data field"""
-            self.track_id = self.next_id()
+            self.track_id = self.next_id() if track_id is None else track_id
             # TODO: remove unnecessary track_id assignments
             self.data = data
-            self._tlbr = np.asarray(data["tlbr"], dtype=np.float)
+            self._tlbr = np.asarray(data["tlbr"], dtype=np.float64)
             self.score = data["score"]
 
             self.is_activated = False
             self.tracklet_len = 0
 
         def set_tlbr(self, tlbr):
-            self._tlbr = np.asarray(tlbr, dtype=np.float)
+            self._tlbr = np.asarray(tlbr, dtype=np.float64)
 
         def initiate(self, frame_id):
             """Initiate a VObj, so that it have tracking property
@@ -139,6 +142,7 @@ class ByteTracker(GroundTrackerBase):
         self.buffer_size = int(ctx.fps / 30.0 * 30)
         self.max_time_lost = self.buffer_size
         self.kalman_filter = KalmanFilter()
+        self.track_ids = TrackIdAllocator()
 
         self.tracked_stracks: List[ByteTracker.Data] = []
         self.lost_stracks: List[ByteTracker.Data] = []
@@ -185,17 +189,43 @@ class ByteTracker(GroundTrackerBase):
         track.mean, track.covariance = prediction
         track.set_tlbr(ByteTracker.Data.xyah_to_tlbr(track.mean[:4]))
 
-    def update(self, data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    def _multiupdate(self,
+                     frame_id,
+                     updates: List[Tuple[Data, Data, bool]]):
+        """`_update` each track with its new track and reactivate flag, with
+        one batched Kalman update"""
+        if len(updates) == 0:
+            return
+        for track, new_track, reactivate in updates:
+            track.update(frame_id, new_track, reactivate)
+        tracks = [track for track, _, _ in updates]
+        prediction = self.kalman_filter.multi_update(
+            np.asarray([track.mean for track in tracks]),
+            np.asarray([track.covariance for track in tracks]),
+            tlbr_to_xyah(tlbrs(tracks)))
+        multi_mean, multi_covariance = prediction
+        multi_tlbr = xyah_to_tlbr(multi_mean[:, :4])
+        for i, track in enumerate(tracks):
+            track.mean = multi_mean[i]
+            track.covariance = multi_covariance[i]
+            track.set_tlbr(multi_tlbr[i])
+
+    def update(self, data: Detections) -> Tuple[List[Dict], List[Dict]]:
         frame_id = self.ctx.frame_id
-        dets: List[ByteTracker.Data] = [ByteTracker.Data(x) for x in data]
+        track_ids = self.track_ids.take(len(data)).tolist()
+        dets: List[ByteTracker.Data] = [ByteTracker.Data(x, track_id)
+                                        for x, track_id in zip(data,
+                                                               track_ids)]
 
         activated_stracks: List[ByteTracker.Data] = []
         refind_stracks: List[ByteTracker.Data] = []
         lost_stracks: List[ByteTracker.Data] = []
         removed_stracks: List[ByteTracker.Data] = []
 
-        dets_high = [x for x in dets if x.score > self.track_thresh]
-        dets_low = [x for x in dets if self.track_thresh >= x.score > 0.1]
+        high = data.score > self.track_thresh
+        low = (data.score <= self.track_thresh) & (data.score > 0.1)
+        dets_high = [dets[i] for i in np.flatnonzero(high)]
+        dets_low = [dets[i] for i in np.flatnonzero(low)]
 
         '''Step 1: Add newly detected tracklets to tracked_stracks'''
         unconfirmed: List[ByteTracker.Data] = []
@@ -210,37 +240,42 @@ class ByteTracker(GroundTrackerBase):
         strack_pool = joint_stracks(tracked_stracks, self.lost_stracks)
         # Predict the current location with KF
         self._multipredict(strack_pool)
-        dists = matching.iou_distance(strack_pool, dets_high)
+        dists = matching.iou_distance(tlbrs(strack_pool), tlbrs(dets_high))
         dists = matching.fuse_score(dists, dets_high)
         result = matching.linear_assignment(dists, thresh=self.match_thresh)
         matches, u_track, u_detection = result
 
+        updates = []
         for itracked, idet in matches:
             track = strack_pool[itracked]
             new_track = dets_high[idet]
             if track.state == TrackState.Tracked:
-                self._update(frame_id, track, new_track)
+                updates.append((track, new_track, False))
                 activated_stracks.append(track)
             else:
-                self._update(frame_id, track, new_track, reactivate=True)
+                updates.append((track, new_track, True))
                 refind_stracks.append(track)
+        self._multiupdate(frame_id, updates)
 
         ''' Step 3: Second association, with low score detection boxes'''
         # association the untrack to the low score detections
         r_tracked_stracks = [strack_pool[i] for i in u_track
                              if strack_pool[i].state == TrackState.Tracked]
-        dists = matching.iou_distance(r_tracked_stracks, dets_low)
+        dists = matching.iou_distance(tlbrs(r_tracked_stracks),
+                                      tlbrs(dets_low))
         result = matching.linear_assignment(dists, thresh=0.5)
         matches, u_track, u_detection_low = result
+        updates = []
         for itracked, idet in matches:
             track = r_tracked_stracks[itracked]
             new_track = dets_low[idet]
             if track.state == TrackState.Tracked:
-                self._update(frame_id, track, new_track)
+                updates.append((track, new_track, False))
                 activated_stracks.append(track)
             else:
-                self._update(frame_id, track, new_track, reactivate=True)
+                updates.append((track, new_track, True))
                 refind_stracks.append(track)
+        self._multiupdate(frame_id, updates)
 
         for it in u_track:
             track = r_tracked_stracks[it]
@@ -251,14 +286,16 @@ class ByteTracker(GroundTrackerBase):
         '''Deal with unconfirmed tracks, usually tracks with only one
         beginning frame'''
         dets_rem = [dets_high[i] for i in u_detection]
-        dists = matching.iou_distance(unconfirmed, dets_rem)
+        dists = matching.iou_distance(tlbrs(unconfirmed), tlbrs(dets_rem))
         dists = matching.fuse_score(dists, dets_rem)
         result = matching.linear_assignment(dists, thresh=0.7)
         matches, u_unconfirmed, u_detection = result
+        updates = []
         for itracked, idet in matches:
             new_track = dets_rem[idet]
-            self._update(frame_id, unconfirmed[itracked], new_track)
+            updates.append((unconfirmed[itracked], new_track, False))
             activated_stracks.append(unconfirmed[itracked])
+        self._multiupdate(frame_id, updates)
         for it in u_unconfirmed:
             track = unconfirmed[it]
             track.mark_removed()
@@ -284,14 +321,43 @@ class ByteTracker(GroundTrackerBase):
         tracked = joint_stracks(tracked, refind_stracks)
         lost = sub_stracks(self.lost_stracks, tracked)
         lost.extend(lost_stracks)
+        # the tracks removed in the previous frames, those removed in this
+        # frame stay lost until the next frame and can still be refound
         lost = sub_stracks(lost, self.removed_stracks)
-        self.removed_stracks.extend(removed_stracks)
+        removed = joint_stracks(self.removed_stracks, removed_stracks)
         tracked, lost = remove_duplicate_stracks(tracked, lost)
         self.tracked_stracks, self.lost_stracks = tracked, lost
+        # track ids are never reused, so only the removed tracks still
+        # tracked or lost are kept instead of all tracks ever removed
+        alive = {t.track_id for t in tracked} | {t.track_id for t in lost}
+        self.removed_stracks = [t for t in removed if t.track_id in alive]
 
         return ([x.extract_data() for x in self.tracked_stracks],
                 [x.extract_data() for x in self.lost_stracks])
 
+    def reserve_track_ids(self, data: Detections):
+        self.track_ids.reserve(len(data))
+
+    def predict(self) -> Tuple[List[Dict], List[Dict]]:
+        activated = [x for x in self.tracked_stracks if x.is_activated]
+        self._multipredict(joint_stracks(activated, self.lost_stracks))
+        tracked = []
+        for track in self.tracked_stracks:
+            if track.is_activated:
+                # matched against the next detections from here
+                track.set_tlbr(ByteTracker.Data.xyah_to_tlbr(track.mean[:4]))
+            data = track.extract_data()
+            data["tlbr"] = track.tlbr
+            tracked.append(data)
+        return tracked, [x.extract_data() for x in self.lost_stracks]
+
+
+def tlbrs(tracks: List[ByteTracker.Data]) -> np.ndarray:
+    """The (N, 4) boxes of the tracks, without copying each box through
+    the `tlbr` property"""
+    return np.array([track._tlbr for track in tracks],
+                    dtype=np.float64).reshape(-1, 4)
+
 
 def joint_stracks(tlista: List[ByteTracker.Data],
                   tlistb: List[ByteTracker.Data]) -> List[ByteTracker.Data]:
@@ -324,7 +390,7 @@ def remove_duplicate_stracks(stracksa: List[ByteTracker.Data],
                              stracksb: List[ByteTracker.Data]
                              ) -> Tuple[List[ByteTracker.Data],
                                         List[ByteTracker.Data]]:
-    pdist = matching.iou_distance(stracksa, stracksb)
+    pdist = matching.iou_distance(tlbrs(stracksa), tlbrs(stracksb))
     pairs = np.where(pdist < 0.15)
     dupa, dupb = list(), list()
     for p, q in zip(*pairs):
@@ -85,6 +85,35 @@ class KalmanFilter(object):
         covariance = np.diag(np.square(std))
         return mean, covariance
 
+    def multi_initiate(self, measurements):
+        """Create tracks from unassociated measurements (Vectorized version).
+        Parameters
+        ----------
+        measurements : ndarray
+            The Nx4 dimensional bounding box coordinates (x, y, a, h).
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx8 dimensional mean matrix and the Nx8x8 dimensional
+            covariance matrices of the new tracks.
+        """
+        height = measurements[:, 3]
+        mean = np.concatenate([measurements, np.zeros_like(measurements)],
+                              axis=1)
+        std = [
+            2 * self._std_weight_position * height,
+            2 * self._std_weight_position * height,
+            1e-2 * np.ones_like(height),
+            2 * self._std_weight_position * height,
+            10 * self._std_weight_velocity * height,
+            10 * self._std_weight_velocity * height,
+            1e-5 * np.ones_like(height),
+            10 * self._std_weight_velocity * height]
+        covariance = np.zeros((len(measurements), 8, 8))
+        diagonal = np.arange(8)
+        covariance[:, diagonal, diagonal] = np.square(std).T
+        return mean, covariance
+
     def predict(self, mean, covariance):
         """Run Kalman filter prediction step.
 
@@ -180,10 +209,9 @@ class KalmanFilter(object):
             self._std_weight_velocity * mean[:, 3]]
         sqr = np.square(np.r_[std_pos, std_vel]).T
 
-        motion_cov = []
-        for i in range(len(mean)):
-            motion_cov.append(np.diag(sqr[i]))
-        motion_cov = np.asarray(motion_cov)
+        motion_cov = np.zeros((len(mean), 8, 8))
+        diagonal = np.arange(8)
+        motion_cov[:, diagonal, diagonal] = sqr
 
         mean = np.dot(mean, self._motion_mat.T)
         left = np.dot(self._motion_mat, covariance).transpose((1, 0, 2))
@@ -225,6 +253,64 @@ class KalmanFilter(object):
             kalman_gain, projected_cov, kalman_gain.T))
         return new_mean, new_covariance
 
+    def multi_project(self, mean, covariance):
+        """Project state distributions to measurement space (Vectorized
+        version).
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 dimensional projected means and the Nx4x4
+            dimensional projected covariance matrices.
+        """
+        std = [
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_position * mean[:, 3],
+            1e-1 * np.ones_like(mean[:, 3]),
+            self._std_weight_position * mean[:, 3]]
+        projected_mean = np.dot(mean, self._update_mat.T)
+        projected_cov = np.matmul(np.matmul(self._update_mat, covariance),
+                                  self._update_mat.T)
+        diagonal = np.arange(4)
+        projected_cov[:, diagonal, diagonal] += np.square(std).T
+        return projected_mean, projected_cov
+
+    def multi_update(self, mean, covariance, measurements):
+        """Run Kalman filter correction step (Vectorized version).
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the predicted states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+        measurements : ndarray
+            The Nx4 dimensional measurement matrix (x, y, a, h).
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # the gains of all states in one batched solve
+        kalman_gain = np.linalg.solve(
+            projected_cov,
+            np.matmul(covariance, self._update_mat.T).transpose((0, 2, 1))
+        ).transpose((0, 2, 1))
+        innovation = measurements - projected_mean
+
+        new_mean = mean + np.matmul(kalman_gain,
+                                    innovation[:, :, np.newaxis])[:, :, 0]
+        new_covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov),
+            kalman_gain.transpose((0, 2, 1)))
+        return new_mean, new_covariance
+
     def gating_distance(self, mean, covariance, measurements,
                         only_position=False, metric='maha'):
         """Compute gating distance between state distribution and measurements.
@@ -268,3 +354,42 @@ class KalmanFilter(object):
             return squared_maha
         else:
             raise ValueError('invalid distance metric')
+
+    def multi_gating_distance(self, mean, covariance, measurements,
+                              only_position=False, metric='maha'):
+        """Compute gating distance between state distributions and
+        measurements (Vectorized version).
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the state distributions.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the state
+            distributions.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements (x, y, a, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix, where the (i, j) element contains the
+            squared Mahalanobis distance between the i-th distribution and
+            `measurements[j]`.
+        """
+        mean, covariance = self.multi_project(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        d = measurements[np.newaxis, :, :] - mean[:, np.newaxis, :]
+        if metric == 'gaussian':
+            return np.sum(d * d, axis=2)
+        elif metric == 'maha':
+            cholesky_factor = np.linalg.cholesky(covariance)
+            z = np.linalg.solve(cholesky_factor, d.transpose((0, 2, 1)))
+            squared_maha = np.sum(z * z, axis=1)
+            return squared_maha
+        else:
+            raise ValueError('invalid distance metric')
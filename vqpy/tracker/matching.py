@@ -1,11 +1,143 @@
+"""Cost matrices and assignment for the trackers.
+The IoU and the linear assignment have pluggable backends, chosen with
+`set_backend`: the compiled cython_bbox and lap packages when they are
+installed, and NumPy and SciPy implementations with the same results
+otherwise.
+"""
+
+from typing import Optional
+
 import numpy as np
 import scipy
-import lap
+import scipy.sparse.csgraph
+from scipy.optimize import linear_sum_assignment
 from scipy.spatial.distance import cdist
 
-from cython_bbox import bbox_overlaps as bbox_ious
 from . import kalman_filter
 
+try:
+    from cython_bbox import bbox_overlaps as _cython_bbox_ious
+except ImportError:
+    _cython_bbox_ious = None
+try:
+    import lap
+except ImportError:
+    lap = None
+
+
+def numpy_ious(boxes: np.ndarray, query_boxes: np.ndarray) -> np.ndarray:
+    """The (N, K) IoU of N boxes and K query boxes in tlbr format, with the
+    inclusive pixel convention of cython_bbox (a box of width 0 covers one
+    pixel)"""
+    iw = (np.minimum(boxes[:, np.newaxis, 2], query_boxes[np.newaxis, :, 2]) -
+          np.maximum(boxes[:, np.newaxis, 0], query_boxes[np.newaxis, :, 0]) +
+          1)
+    ih = (np.minimum(boxes[:, np.newaxis, 3], query_boxes[np.newaxis, :, 3]) -
+          np.maximum(boxes[:, np.newaxis, 1], query_boxes[np.newaxis, :, 1]) +
+          1)
+    overlap = (iw > 0) & (ih > 0)
+    inter = np.where(overlap, iw * ih, 0.)
+    areas = ((boxes[:, 2] - boxes[:, 0] + 1) *
+             (boxes[:, 3] - boxes[:, 1] + 1))
+    query_areas = ((query_boxes[:, 2] - query_boxes[:, 0] + 1) *
+                   (query_boxes[:, 3] - query_boxes[:, 1] + 1))
+    union = areas[:, np.newaxis] + query_areas[np.newaxis, :] - inter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(overlap, inter / union, 0.)
+
+
+# the size of the cost matrices assigned by scipy_lapjv in one piece
+_LSA_COMPONENT_SIZE = 256 * 256
+
+
+def scipy_lapjv(cost_matrix: np.ndarray, cost_limit: float):
+    """`lap.lapjv(cost_matrix, extend_cost=True, cost_limit=cost_limit)`
+    with SciPy: leaving a row and a column unassigned costs cost_limit, as
+    the extended cost matrix of lap does, so only the pairs cheaper than
+    cost_limit are worth assigning. For large matrices, the pairs are split
+    in the connected components of their rows and columns, e.g. the tracks
+    and the detections near them, each assigned separately.
+    returns: (the column of each row, the row of each column), -1 if
+        unassigned"""
+    n_rows, n_cols = cost_matrix.shape
+    x = np.full(n_rows, -1, dtype=int)
+    y = np.full(n_cols, -1, dtype=int)
+    gain = cost_matrix - cost_limit
+    if gain.size <= _LSA_COMPONENT_SIZE:
+        assigned_rows, assigned_cols = \
+            linear_sum_assignment(np.minimum(gain, 0))
+        assigned = gain[assigned_rows, assigned_cols] < 0
+        x[assigned_rows[assigned]] = assigned_cols[assigned]
+        y[assigned_cols[assigned]] = assigned_rows[assigned]
+        return x, y
+    rows, cols = np.nonzero(gain < 0)
+    if len(rows) == 0:
+        return x, y
+    # the bipartite graph of rows and then columns
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(rows)), (rows, n_rows + cols)),
+        shape=(n_rows + n_cols, n_rows + n_cols))
+    _, labels = scipy.sparse.csgraph.connected_components(graph,
+                                                          directed=False)
+    row_labels, col_labels = labels[:n_rows], labels[n_rows:]
+    # the components of a single pair need no assignment
+    row_degree = np.bincount(rows, minlength=n_rows)
+    col_degree = np.bincount(cols, minlength=n_cols)
+    single = (row_degree[rows] == 1) & (col_degree[cols] == 1)
+    x[rows[single]] = cols[single]
+    y[cols[single]] = rows[single]
+    for label in np.unique(row_labels[rows[~single]]):
+        component_rows = np.flatnonzero(row_labels == label)
+        component_cols = np.flatnonzero(col_labels == label)
+        component = np.minimum(gain[np.ix_(component_rows, component_cols)],
+                               0)
+        assigned_rows, assigned_cols = linear_sum_assignment(component)
+        assigned = component[assigned_rows, assigned_cols] < 0
+        assigned_rows = component_rows[assigned_rows[assigned]]
+        assigned_cols = component_cols[assigned_cols[assigned]]
+        x[assigned_rows] = assigned_cols
+        y[assigned_cols] = assigned_rows
+    return x, y
+
+
+def _lap_lapjv(cost_matrix: np.ndarray, cost_limit: float):
+    _, x, y = lap.lapjv(cost_matrix, extend_cost=True, cost_limit=cost_limit)
+    return x, y
+
+
+_iou_backends = {
+    "numpy": numpy_ious,
+}
+if _cython_bbox_ious is not None:
+    _iou_backends["cython_bbox"] = _cython_bbox_ious
+_assignment_backends = {
+    "scipy": scipy_lapjv,
+}
+if lap is not None:
+    _assignment_backends["lap"] = _lap_lapjv
+
+# the backends in use, the compiled ones when installed
+bbox_ious = _iou_backends.get("cython_bbox", numpy_ious)
+_lapjv = _assignment_backends.get("lap", scipy_lapjv)
+
+
+def set_backend(iou: Optional[str] = None, assignment: Optional[str] = None):
+    """Choose the implementations of the IoU ("numpy" or "cython_bbox") and
+    of the linear assignment ("scipy" or "lap"), None keeps the current one.
+    """
+    global bbox_ious, _lapjv
+    if iou is not None:
+        if iou not in _iou_backends:
+            raise ValueError(f"IoU backend {iou} is not available, choose "
+                             f"from {list(_iou_backends.keys())}")
+        bbox_ious = _iou_backends[iou]
+    if assignment is not None:
+        if assignment not in _assignment_backends:
+            raise ValueError(f"Assignment backend {assignment} is not "
+                             f"available, choose from "
+                             f"{list(_assignment_backends.keys())}")
+        _lapjv = _assignment_backends[assignment]
+
 
 def merge_matches(m1, m2, shape):
     O, P, Q = shape
@@ -43,7 +175,7 @@ def linear_assignment(cost_matrix, thresh):
                 tuple(range(cost_matrix.shape[0])),
                 tuple(range(cost_matrix.shape[1])))
     matches, unmatched_a, unmatched_b = [], [], []
-    cost, x, y = lap.lapjv(cost_matrix, extend_cost=True, cost_limit=thresh)
+    x, y = _lapjv(cost_matrix, thresh)
     for ix, mx in enumerate(x):
         if mx >= 0:
             matches.append([ix, mx])
@@ -61,13 +193,13 @@ def ious(atlbrs, btlbrs):
 
     :rtype ious np.ndarray
     """
-    ious = np.zeros((len(atlbrs), len(btlbrs)), dtype=np.float)
+    ious = np.zeros((len(atlbrs), len(btlbrs)), dtype=np.float64)
     if ious.size == 0:
         return ious
 
     ious = bbox_ious(
-        np.ascontiguousarray(atlbrs, dtype=np.float),
-        np.ascontiguousarray(btlbrs, dtype=np.float)
+        np.ascontiguousarray(atlbrs, dtype=np.float64),
+        np.ascontiguousarray(btlbrs, dtype=np.float64)
     )
 
     return ious
@@ -76,13 +208,14 @@ def ious(atlbrs, btlbrs):
 def iou_distance(atracks, btracks):
     """
     Compute cost based on IoU
-    :type atracks: list[STrack]
-    :type btracks: list[STrack]
+    :type atracks: list[STrack] | np.ndarray
+    :type btracks: list[STrack] | np.ndarray
 
     :rtype cost_matrix np.ndarray
     """
 
-    if ((len(atracks) > 0 and isinstance(atracks[0], np.ndarray)) or
+    if (isinstance(atracks, np.ndarray) or isinstance(btracks, np.ndarray) or
+            (len(atracks) > 0 and isinstance(atracks[0], np.ndarray)) or
             (len(btracks) > 0 and isinstance(btracks[0], np.ndarray))):
         atlbrs = atracks
         btlbrs = btracks
@@ -125,17 +258,17 @@ def embedding_distance(tracks, detections, metric='cosine'):
     :return: cost_matrix np.ndarray
     """
 
-    cost_matrix = np.zeros((len(tracks), len(detections)), dtype=np.float)
+    cost_matrix = np.zeros((len(tracks), len(detections)), dtype=np.float64)
     if cost_matrix.size == 0:
         return cost_matrix
     det_features = np.asarray([track.curr_feat for track in detections],
-                              dtype=np.float)
+                              dtype=np.float64)
     # for i, track in enumerate(tracks):
     #     cost_matrix[i, :] = np.maximum(0.0,
     #                                    cdist(track.smooth_feat.reshape(1,-1),
     #                                    det_features, metric))
     track_features = np.asarray([track.smooth_feat for track in tracks],
-                                dtype=np.float)
+                                dtype=np.float64)
     # Nomalized features
     cost_matrix = np.maximum(0.0, cdist(track_features, det_features, metric))
     return cost_matrix
@@ -147,10 +280,11 @@ def gate_cost_matrix(kf, cost_matrix, tracks, detections, only_position=False):
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     measurements = np.asarray([det.to_xyah() for det in detections])
-    for row, track in enumerate(tracks):
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = np.inf
+    gating_distance = kf.multi_gating_distance(
+        np.asarray([track.mean for track in tracks]),
+        np.asarray([track.covariance for track in tracks]),
+        measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = np.inf
     return cost_matrix
 
 
@@ -161,13 +295,13 @@ def fuse_motion(kf, cost_matrix, tracks, detections,
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     measurements = np.asarray([det.to_xyah() for det in detections])
-    for row, track in enumerate(tracks):
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements,
-            only_position, metric='maha')
-        cost_matrix[row, gating_distance > gating_threshold] = np.inf
-        cost_matrix[row] = (lambda_ * cost_matrix[row] +
-                            (1 - lambda_) * gating_distance)
+    gating_distance = kf.multi_gating_distance(
+        np.asarray([track.mean for track in tracks]),
+        np.asarray([track.covariance for track in tracks]),
+        measurements, only_position, metric='maha')
+    cost_matrix[gating_distance > gating_threshold] = np.inf
+    cost_matrix[:] = (lambda_ * cost_matrix +
+                      (1 - lambda_) * gating_distance)
     return cost_matrix
 
 
@@ -0,0 +1,39 @@
+from typing import Any, List, Optional
+
+
+class RingBuffer:
+    """An append-only sequence keeping only the latest `capacity` items.
+
+    Items are indexed by their absolute position since the first append, the
+    same as a list, and `len()` counts every item ever appended. Items that
+    dropped out of the buffer read as None. Negative indices count from the
+    latest item. When `capacity` is None all items are kept.
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        if capacity is not None and capacity <= 0:
+            raise ValueError("capacity of a ring buffer should be positive")
+        self.capacity = capacity
+        self._items: List[Any] = [] if capacity is None else [None] * capacity
+        self._length = 0
+
+    def append(self, item: Any):
+        if self.capacity is None:
+            self._items.append(item)
+        else:
+            self._items[self._length % self.capacity] = item
+        self._length += 1
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._length
+        if index < 0 or index >= self._length:
+            raise IndexError("ring buffer index out of range")
+        if self.capacity is None:
+            return self._items[index]
+        if index < self._length - self.capacity:
+            return None
+        return self._items[index % self.capacity]
@@ -1,32 +1,179 @@
+import queue
+import sys
+import threading
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
 import cv2
+import numpy as np
 from loguru import logger
 
 # TODO: support different types of video streams
 
 
+class _Prefetcher:
+    """Decodes frames on a background thread into a ring of preallocated
+    buffers. A buffer is decoded into again only when no frame handed out
+    from it is referenced anymore (including views, e.g. image crops);
+    otherwise a new buffer takes its place in the ring. Frames skipped by the
+    stride are only grabbed."""
+
+    def __init__(self,
+                 cap: cv2.VideoCapture,
+                 size: int,
+                 shape,
+                 is_analyzed: Callable[[int], bool]):
+        self._cap = cap
+        self._is_analyzed = is_analyzed
+        self._shape = shape
+        self._buffers: List[np.ndarray] = [np.empty(shape, np.uint8)
+                                           for _ in range(size + 1)]
+        self._next_slot = 0
+        self._queue = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._ended = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _buffer(self) -> np.ndarray:
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % len(self._buffers)
+        # referenced by the ring and the getrefcount argument only
+        if sys.getrefcount(self._buffers[slot]) > 2:
+            self._buffers[slot] = np.empty(self._shape, np.uint8)
+        return self._buffers[slot]
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        n_read = 0
+        while not self._stop.is_set():
+            if not self._is_analyzed(n_read):
+                ret_val, frame = self._cap.grab(), None
+            else:
+                ret_val, frame = self._cap.read(image=self._buffer())
+            if not self._put((ret_val, frame)) or not ret_val:
+                return
+            n_read += 1
+            del frame
+
+    def get(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """The next (ret_val, frame) as VideoCapture.read returns"""
+        if self._ended:
+            return False, None
+        ret_val, frame = self._queue.get()
+        self._ended = not ret_val
+        return ret_val, frame
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
 class FrameStream:
     output_fields = ['frame', 'frame_id', 'frame_width', 'frame_height', 'fps']
 
-    def __init__(self, path):
+    def __init__(self,
+                 path,
+                 prefetch: int = 0,
+                 headless: bool = False,
+                 stride: int = 1,
+                 target_fps: Optional[float] = None,
+                 start_frame: int = 0,
+                 end_frame: Optional[int] = None):
+        """
+        prefetch: the number of frames decoded ahead on a background thread,
+            0 decodes each frame synchronously in `read`.
+        headless: skip polling the GUI event loop (cv2.waitKey) per frame in
+            `advance`.
+        stride: decode only every `stride`-th frame, the others are skipped
+            without decoding and `read` returns None for them.
+        target_fps: set the stride to analyze about `target_fps` frames per
+            second of video, overriding `stride`.
+        start_frame, end_frame: read only the frames in [start_frame,
+            end_frame) of the video. frame_id and the stride still count from
+            the start of the video.
+        """
         self._cap = cv2.VideoCapture(path)
         self.frame_width = self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)  # float
         self.frame_height = self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)  # float
         self.fps = self._cap.get(cv2.CAP_PROP_FPS)
         self.n_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.frame_id = -1
+        if end_frame is not None:
+            self.n_frames = min(self.n_frames, end_frame)
+        self.start_frame = min(max(start_frame, 0), self.n_frames)
+        if self.start_frame > 0:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        self.n_frames -= self.start_frame
+        self.frame_id = self.start_frame - 1
         self.frame = None
+        self.headless = headless
+        self._n_read = 0
         logger.info(f"Parameters of video is width={self.frame_width}, \
                       height={self.frame_height}, fps={self.fps}")
         self._objdatas = None
+        # the @property names each VObj type evaluates per frame, set by the
+        # demand analysis of the queries run on this stream
+        self.eager_names: Dict[type, Optional[FrozenSet[str]]] = {}
+        if target_fps is not None and self.fps > 0:
+            stride = round(self.fps / target_fps)
+        self.stride = max(int(stride), 1)
+        self._prefetcher = None
+        if prefetch > 0:
+            shape = (int(self.frame_height), int(self.frame_width), 3)
+            self._prefetcher = _Prefetcher(self._cap, prefetch, shape,
+                                           self.is_analyzed)
 
     def next(self):
-        self.frame_id += 1
-        ret_val, self.frame = self._cap.read()
+        return self.advance(self.read())
+
+    def read(self):
+        """Decode the next frame without moving the stream context.
+        This can run ahead of `advance`, e.g. in a decoding worker.
+        returns: the frame, or None if it is skipped by the stride."""
+        if self._prefetcher is not None:
+            ret_val, frame = self._prefetcher.get()
+        elif not self.is_analyzed(self._n_read):
+            ret_val, frame = self._cap.grab(), None
+        else:
+            ret_val, frame = self._cap.read()
         if not ret_val:
             logger.info(f"Failed to load frame stream with id of "
-                        f"{self.frame_id}")
+                        f"{self._n_read}")
             raise IOError
-        ch = cv2.waitKey(1)
-        if ch == 27 or ch == ord("q") or ch == ord('Q'):
-            raise KeyboardInterrupt
+        self._n_read += 1
+        return frame
+
+    def is_analyzed(self, index: int) -> bool:
+        """Whether the `index`-th frame read (from 0) is decoded under the
+        stride"""
+        return (self.start_frame + index) % self.stride == 0
+
+    def advance(self, frame):
+        """Move the stream context (frame_id, frame) to the next frame,
+        frame is None for a frame skipped by the stride"""
+        # the GUI events are polled here rather than in `read`, since HighGUI
+        # must run on the thread consuming the frames, not a decoding worker
+        if not self.headless:
+            ch = cv2.waitKey(1)
+            if ch == 27 or ch == ord("q") or ch == ord('Q'):
+                raise KeyboardInterrupt
+        self.frame_id += 1
+        self.frame = frame
         return self.frame
+
+    def is_opened(self) -> bool:
+        return self._cap.isOpened()
+
+    def close(self):
+        """Stop the prefetching thread and release the video"""
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+        self._cap.release()